@@ -0,0 +1,168 @@
+# backend/app/assignment_cache.py
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .db import IS_SQLITE, SessionLocal, engine
+from .models import Assignment, Locker
+
+# Schema probing, resolved once at import (the model has active + created_at)
+if hasattr(Assignment, "ended_at"):
+    OPEN_FILTER = Assignment.ended_at == None  # noqa: E711
+elif hasattr(Assignment, "active"):
+    OPEN_FILTER = Assignment.active == True  # noqa: E712
+else:
+    OPEN_FILTER = None  # every row is current
+ORDER_BY = getattr(Assignment, "created_at", Assignment.id).desc()
+
+# Writers touch this file; every worker stats it before a cached read
+_default_signal = (
+    f"{engine.url.database}.assignments"
+    if IS_SQLITE and engine.url.database not in (None, "", ":memory:")
+    else str(Path(tempfile.gettempdir()) / "facelocker-assignments.signal")
+)
+CACHE_SIGNAL = Path(os.getenv("ASSIGNMENT_CACHE_SIGNAL", _default_signal))
+# full reload at least this often, for writers on other hosts
+CACHE_TTL_S = float(os.getenv("ASSIGNMENT_CACHE_TTL_S", "30"))
+
+
+class CachedAssignment:
+    """An open assignment as cached (what AssignmentOut and /api/unlock read)."""
+
+    __slots__ = ("id", "user_id", "locker_id", "active", "created_at", "site_id")
+
+    def __init__(self, row, site_id: str | None):
+        self.id = row.id
+        self.user_id = row.user_id
+        self.locker_id = row.locker_id
+        self.active = getattr(row, "active", True)
+        self.created_at = getattr(row, "created_at", None)
+        self.site_id = site_id
+
+
+class AssignmentCache:
+    """
+    In-process copy of the open assignments: user_id -> assignment (with its
+    locker's site_id) and locker_id -> user_id. Loaded with one query, kept
+    current by write-through from create_assignment / delete_user, and
+    reloaded when another worker's write touches CACHE_SIGNAL (one stat per
+    lookup) or CACHE_TTL_S has passed.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, signal: Path = CACHE_SIGNAL, ttl_s: float = CACHE_TTL_S):
+        self.signal = Path(signal)
+        self.ttl_s = ttl_s
+        self.by_user: dict[str, CachedAssignment] = {}
+        self.by_locker: dict[int, str] = {}
+        self._seen = None  # signal stamp the maps reflect
+        self._loaded_at = 0.0
+        self._mu = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = AssignmentCache()
+        return cls._instance
+
+    # --- reads ---
+
+    def for_user(self, user_id: str) -> CachedAssignment | None:
+        self._fresh()
+        self.hits += 1
+        return self.by_user.get(user_id)
+
+    def user_for_locker(self, locker_id: int) -> str | None:
+        self._fresh()
+        self.hits += 1
+        return self.by_locker.get(locker_id)
+
+    def _fresh(self) -> None:
+        if (
+            self._stamp() != self._seen
+            or time.monotonic() - self._loaded_at > self.ttl_s
+        ):
+            self.load()
+
+    def load(self) -> None:
+        """(Re)build both maps from the database."""
+        with self._mu:
+            stamp = self._stamp()  # before reading: a racing write reloads again
+            with SessionLocal() as db:
+                q = db.query(Assignment, Locker.site_id).outerjoin(
+                    Locker, Locker.locker_id == Assignment.locker_id
+                )
+                if OPEN_FILTER is not None:
+                    q = q.filter(OPEN_FILTER)
+                rows = q.order_by(ORDER_BY).all()
+            by_user, by_locker = {}, {}
+            for row, site_id in rows:  # newest first: keep the first per user
+                if row.user_id not in by_user:
+                    by_user[row.user_id] = CachedAssignment(row, site_id)
+                    by_locker.setdefault(row.locker_id, row.user_id)
+            self.by_user, self.by_locker = by_user, by_locker
+            self._seen, self._loaded_at = stamp, time.monotonic()
+            self.loads += 1
+
+    # --- write-through ---
+
+    def put(self, row, site_id: str | None) -> None:
+        """A new assignment was committed (older ones for its user/locker closed)."""
+        with self._mu:
+            self._evict_user(row.user_id)
+            holder = self.by_locker.pop(row.locker_id, None)
+            if holder is not None:
+                self.by_user.pop(holder, None)
+            if OPEN_FILTER is None or getattr(row, "active", True):
+                self.by_user[row.user_id] = CachedAssignment(row, site_id)
+                self.by_locker[row.locker_id] = row.user_id
+        self._notify()
+
+    def drop_user(self, user_id: str) -> None:
+        with self._mu:
+            self._evict_user(user_id)
+        self._notify()
+
+    def _evict_user(self, user_id: str) -> None:
+        old = self.by_user.pop(user_id, None)
+        if old is not None and self.by_locker.get(old.locker_id) == user_id:
+            del self.by_locker[old.locker_id]
+
+    def _notify(self) -> None:
+        """Tell the other workers to reload (we already applied the change)."""
+        before = self._stamp()
+        try:
+            self.signal.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.signal.with_name(f".{self.signal.name}.{os.getpid()}.tmp")
+            tmp.write_text(f"{time.time_ns()}\n")
+            os.replace(tmp, self.signal)  # new inode: a changed stamp
+        except OSError as e:
+            print(f"[assignments] cache signal failed: {e}")
+            return
+        with self._mu:
+            if before == self._seen:  # else another worker wrote too: reload
+                self._seen = self._stamp()
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.signal)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self.by_user),
+            "lockers": len(self.by_locker),
+            "loads": self.loads,
+            "hits": self.hits,
+            "ttl_s": self.ttl_s,
+        }
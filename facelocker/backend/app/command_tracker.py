@@ -0,0 +1,251 @@
+# backend/app/command_tracker.py
+import heapq
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future
+import numpy as np
+
+# The ESP acks after the relay pulse, so a command's timeout is its
+# duration_ms plus this margin.
+ACK_TIMEOUT_MS = float(os.getenv("UNLOCK_ACK_TIMEOUT_MS", "1500"))
+# Re-publishes after a missing ack. Off by default: the ack is QoS 0, so a
+# lost ack is not a lost unlock, and only firmware that skips request_ids it
+# has already run (esp_controller since this change) makes a resend safe.
+ACK_RETRIES = int(os.getenv("UNLOCK_ACK_RETRIES", "0"))
+LATENCY_WINDOW = 512  # latest acks kept per locker / controller for percentiles
+RECENT_KEEP = 1000  # finished commands kept for status lookups and late acks
+COUNTERS = (
+    "sent",
+    "retried",
+    "acked",
+    "unconfirmed",
+    "late",
+    "duplicate",
+    "wrong_site",
+    "untracked",
+    "unsent",
+)
+
+
+class PendingCommand:
+    """One published `cmd` awaiting its door ack (matched on request_id)."""
+
+    def __init__(self, site_id: str, cmd: dict, timeout_s: float, retries: int):
+        self.request_id = cmd["request_id"]
+        self.site_id = site_id
+        self.cmd = cmd
+        self.timeout_s = timeout_s
+        self.retries_left = retries
+        self.attempts = 0
+        self.sent_at = 0.0  # first publish (time.monotonic)
+        self.deadline = 0.0
+        self.status = "pending"  # pending | acked | unconfirmed | unsent
+        self.latency_ms: float | None = None
+        self.controller: str | None = None
+        self.future: Future = Future()  # resolves to snapshot(); safe to await
+
+    def snapshot(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "status": self.status,
+            "site_id": self.site_id,
+            "locker_id": self.cmd.get("locker_id"),
+            "attempts": self.attempts,
+            "latency_ms": self.latency_ms,
+            "controller": self.controller,
+        }
+
+
+class LatencyWindow:
+    """Command -> ack latencies (ms) for one locker or controller."""
+
+    def __init__(self):
+        self.samples: deque = deque(maxlen=LATENCY_WINDOW)
+        self.acked = 0
+        self.unconfirmed = 0
+
+    def snapshot(self) -> dict:
+        out = {
+            "acked": self.acked,
+            "unconfirmed": self.unconfirmed,
+            "n": len(self.samples),
+        }
+        if self.samples:
+            p50, p90, p99 = np.percentile(
+                np.fromiter(self.samples, float), [50, 90, 99]
+            )
+            out.update(
+                p50_ms=round(float(p50), 1),
+                p90_ms=round(float(p90), 1),
+                p99_ms=round(float(p99), 1),
+                max_ms=round(max(self.samples), 1),
+            )
+        return out
+
+
+class CommandTracker:
+    """
+    Pending-command table for unlock `cmd`s. send() publishes and registers
+    the request_id; the bridge calls ack() for every door event carrying a
+    request_id, which resolves the command's future with its latency; acks
+    from a site other than the one the command went to are ignored. A
+    command without an ack after duration_ms + UNLOCK_ACK_TIMEOUT_MS is
+    resolved as "unconfirmed": the relay may well have pulsed and only the
+    QoS 0 ack was lost, so it is not re-sent unless UNLOCK_ACK_RETRIES is
+    set (same request_id, which the firmware runs at most once). A late ack
+    still counts in `late`. Latency is measured from the
+    first publish, so it is what the person at the door waits (relay pulse
+    included), and is kept per locker (<site>/<locker_id>) and per
+    controller (the ack's `source`, the ESP's DEVICE_ID).
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, timeout_ms: float = ACK_TIMEOUT_MS, retries: int = ACK_RETRIES):
+        self.timeout_ms = max(0.0, timeout_ms)
+        self.retries = max(0, retries)
+        self._pending: dict[str, PendingCommand] = {}
+        self._recent: OrderedDict[str, PendingCommand] = OrderedDict()
+        self._deadlines: list[tuple[float, str]] = []  # heap
+        self._cv = threading.Condition()
+        self.lockers: dict[str, LatencyWindow] = {}
+        self.controllers: dict[str, LatencyWindow] = {}
+        self.counts: Counter = Counter()
+        self._thread = threading.Thread(
+            target=self._loop, name="unlock-acks", daemon=True
+        )
+        self._thread.start()
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = CommandTracker()
+        return cls._instance
+
+    def send(self, site_id: str, cmd: dict) -> PendingCommand:
+        """Publish cmd and track it; status is "unsent" if the bridge is offline."""
+        timeout_s = (cmd.get("duration_ms") or 0) / 1000.0 + self.timeout_ms / 1000.0
+        p = PendingCommand(site_id, cmd, timeout_s, self.retries)
+        p.sent_at = time.monotonic()
+        with self._cv:
+            self._pending[p.request_id] = p
+        if not self._publish(p):
+            with self._cv:
+                self._pending.pop(p.request_id, None)
+            self.counts["unsent"] += 1
+            self._finish(p, "unsent")
+        return p
+
+    def _publish(self, p: PendingCommand) -> bool:
+        from .mqtt_bridge import publish_cmd  # lazy: mqtt_bridge imports us
+
+        if not publish_cmd(p.site_id, p.cmd):
+            return False
+        now = time.monotonic()
+        with self._cv:
+            p.attempts += 1
+            p.deadline = now + p.timeout_s
+            heapq.heappush(self._deadlines, (p.deadline, p.request_id))
+            self._cv.notify()
+        self.counts["sent" if p.attempts == 1 else "retried"] += 1
+        return True
+
+    def ack(self, site_id: str, payload: dict) -> None:
+        """Door event from the bridge (any request_id; unknown ones are counted)."""
+        rid = str(payload.get("request_id") or "")
+        now = time.monotonic()
+        with self._cv:
+            p = self._pending.get(rid)
+            if p is None:
+                done = self._recent.get(rid)
+            elif p.site_id != site_id:
+                self.counts["wrong_site"] += 1  # same id, other site's controller
+                return
+            else:
+                del self._pending[rid]
+        if p is None:
+            if done is None:
+                self.counts["untracked"] += 1  # e.g. sent by a tablet itself
+            elif done.site_id != site_id:
+                self.counts["wrong_site"] += 1
+            elif done.status == "unconfirmed":
+                self.counts["late"] += 1
+            else:
+                self.counts["duplicate"] += 1
+            return
+        p.latency_ms = round((now - p.sent_at) * 1000.0, 1)
+        p.controller = str(payload.get("source") or "unknown")
+        self.counts["acked"] += 1
+        for table, key in (
+            (self.lockers, f"{p.site_id}/{p.cmd.get('locker_id')}"),
+            (self.controllers, p.controller),
+        ):
+            w = table.setdefault(key, LatencyWindow())
+            w.samples.append(p.latency_ms)
+            w.acked += 1
+        self._finish(p, "acked")
+
+    def _loop(self) -> None:
+        while True:
+            expired = []
+            with self._cv:
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    deadline, rid = heapq.heappop(self._deadlines)
+                    p = self._pending.get(rid)
+                    if p is not None and p.deadline == deadline:  # else acked / re-sent
+                        expired.append(p)
+                wait = self._deadlines[0][0] - now if self._deadlines else None
+                if not expired:
+                    self._cv.wait(wait)
+                    continue
+            for p in expired:
+                with self._cv:
+                    if p.request_id not in self._pending:
+                        continue  # acked meanwhile: never pulse twice
+                if p.retries_left > 0:
+                    p.retries_left -= 1
+                    if self._publish(p):
+                        continue
+                with self._cv:
+                    if self._pending.pop(p.request_id, None) is None:
+                        continue  # acked meanwhile
+                self.counts["unconfirmed"] += 1
+                w = self.lockers.setdefault(
+                    f"{p.site_id}/{p.cmd.get('locker_id')}", LatencyWindow()
+                )
+                w.unconfirmed += 1
+                self._finish(p, "unconfirmed")
+
+    def _finish(self, p: PendingCommand, status: str) -> None:
+        p.status = status
+        with self._cv:
+            self._recent[p.request_id] = p
+            while len(self._recent) > RECENT_KEEP:
+                self._recent.popitem(last=False)
+        p.future.set_result(p.snapshot())
+
+    def status(self, request_id: str) -> dict | None:
+        with self._cv:
+            p = self._pending.get(request_id) or self._recent.get(request_id)
+        return p.snapshot() if p is not None else None
+
+    def stats(self) -> dict:
+        with self._cv:
+            pending = len(self._pending)
+        return {
+            "timeout_ms": self.timeout_ms,
+            "retries": self.retries,
+            "pending": pending,
+            **{k: self.counts[k] for k in COUNTERS},
+            # list(): ack() may add keys from the bridge's worker threads
+            "lockers": {k: w.snapshot() for k, w in sorted(list(self.lockers.items()))},
+            "controllers": {
+                k: w.snapshot() for k, w in sorted(list(self.controllers.items()))
+            },
+        }
@@ -10,6 +10,13 @@ class Settings(BaseModel):
     mqtt_host: str = os.getenv("MQTT_HOST", "localhost")
     mqtt_port: int = int(os.getenv("MQTT_PORT", "1883"))
     mqtt_use_tls: bool = os.getenv("MQTT_USE_TLS", "false").lower() == "true"
+    # one backend for every site on the broker (sites/+/locker/#)
+    mqtt_multi_site: bool = os.getenv("MQTT_MULTI_SITE", "false").lower() == "true"
+    mqtt_workers: int = int(os.getenv("MQTT_WORKERS", "4"))
+    # multi-site: the site ids to serve (comma-separated); empty = the first
+    # mqtt_sites_max ids seen, messages from any later one are rejected
+    mqtt_sites: list[str] = os.getenv("MQTT_SITES", "").split(",")
+    mqtt_sites_max: int = int(os.getenv("MQTT_SITES_MAX", "1000"))
 
 
 settings = Settings()
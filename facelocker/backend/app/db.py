@@ -1,5 +1,5 @@
 ﻿# backend/app/db.py
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .config import settings
 
@@ -36,6 +36,29 @@ SessionLocal = sessionmaker(
 Base = declarative_base()
 
 
+def add_missing_columns(model) -> None:
+    """
+    create_all() never alters existing tables: add the nullable columns and
+    the indexes a model gained since its table was created.
+    """
+    table = model.__table__
+    insp = inspect(engine)
+    if not insp.has_table(table.name):
+        return
+    have = {c["name"] for c in insp.get_columns(table.name)}
+    missing = [c for c in table.columns if c.name not in have and c.nullable]
+    if missing:
+        with engine.begin() as conn:
+            for col in missing:
+                ddl = col.type.compile(dialect=engine.dialect)
+                conn.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {ddl}")
+                )
+        print(f"[db] {table.name}: added {', '.join(c.name for c in missing)}")
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
 def get_db():
     db = SessionLocal()
     try:
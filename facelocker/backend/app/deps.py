@@ -0,0 +1,43 @@
+# backend/app/deps.py
+from fastapi import HTTPException
+
+from .face.batcher import MicroBatcher
+from .face.engine import check_det_size
+from .face.executor import InferenceExecutor, Saturated, FACE_RETRY_AFTER
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="inference_busy",
+        headers={"Retry-After": str(FACE_RETRY_AFTER)},
+    )
+
+
+async def run_inference(fn, *args):
+    """Run a face job on the inference pool; 503 + Retry-After when it is full."""
+    try:
+        return await InferenceExecutor.get().run(fn, *args)
+    except Saturated:
+        raise _busy()
+
+
+async def recognize_frame(raw: bytes, det_size: int | None = None):
+    """Detect + embed one frame through the micro-batcher (same 503 rule)."""
+    return await recognize_item("frame", raw, det_size)
+
+
+async def recognize_item(kind: str, raw: bytes, arg=None):
+    """Embed a frame / crop / aligned face through the micro-batcher."""
+    try:
+        return await MicroBatcher.get().submit(kind, raw, arg)
+    except Saturated:
+        raise _busy()
+
+
+def det_size_param(det_size: int | None) -> int | None:
+    """Validate an optional det_size form/query value (400 if unsupported)."""
+    try:
+        return check_det_size(det_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,148 @@
+# backend/app/event_ingest.py
+import os
+import queue
+import threading
+import time
+import traceback
+from collections import Counter
+
+from .db import engine
+from .models import Event
+
+EVENT_BATCH_MAX = int(os.getenv("EVENT_BATCH_MAX", "500"))
+EVENT_FLUSH_MS = float(os.getenv("EVENT_FLUSH_MS", "200"))
+EVENT_QUEUE_MAX = int(os.getenv("EVENT_QUEUE_MAX", "20000"))
+# how long a full queue may stall the submitting thread before a row is dropped
+EVENT_BLOCK_MS = float(os.getenv("EVENT_BLOCK_MS", "20"))
+EVENT_RETRIES = 3
+
+
+class EventIngest:
+    """
+    Buffered writer for `events` rows. submit() only enqueues; a daemon
+    thread inserts everything waiting as one transaction once `batch_max`
+    rows are queued or `flush_ms` after the first one arrived, so a burst
+    of telemetry costs one commit instead of one per message. submit() is
+    called from every MQTT shard worker; when the queue is full it blocks
+    the calling worker up to `block_ms` (its site queue then backs up) and
+    drops the row, counting it in `dropped`. stop() drains the queue and
+    commits what is left.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        batch_max: int = EVENT_BATCH_MAX,
+        flush_ms: float = EVENT_FLUSH_MS,
+        queue_max: int = EVENT_QUEUE_MAX,
+        block_ms: float = EVENT_BLOCK_MS,
+    ):
+        self.batch_max = max(1, batch_max)
+        self.flush_s = max(0.0, flush_ms) / 1000.0
+        self.block_s = max(0.0, block_ms) / 1000.0
+        self._q: queue.Queue = queue.Queue(maxsize=max(1, queue_max))
+        self._closing = threading.Event()
+        self._count_lock = threading.Lock()  # received/dropped: many submitters
+        self.received = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flush_ms_total = 0.0
+        self.histogram: Counter = Counter()
+        self._thread = threading.Thread(
+            target=self._loop, name="event-ingest", daemon=True
+        )
+        self._thread.start()
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = EventIngest()
+        return cls._instance
+
+    def submit(self, row: dict) -> bool:
+        """Queue one events row (column -> value); False if it was dropped."""
+        with self._count_lock:
+            self.received += 1
+        if not self._closing.is_set():
+            try:
+                self._q.put(row, timeout=self.block_s)
+                return True
+            except queue.Full:
+                pass
+        with self._count_lock:
+            self.dropped += 1
+            dropped = self.dropped
+        if dropped & (dropped - 1) == 0:  # 1, 2, 4, 8, ...: don't flood
+            print(f"[events] ingest queue full, {dropped} events dropped")
+        return False
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                first = self._q.get(timeout=0.5)
+            except queue.Empty:
+                if self._closing.is_set():
+                    return
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_s
+            while len(batch) < self.batch_max:
+                left = deadline - time.monotonic()
+                try:
+                    if self._closing.is_set() or left <= 0:
+                        batch.append(self._q.get_nowait())
+                    else:
+                        batch.append(self._q.get(timeout=left))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: list[dict], retries: int = EVENT_RETRIES) -> None:
+        for attempt in range(retries):
+            t0 = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    conn.execute(Event.__table__.insert(), batch)
+            except Exception:
+                print("[events] batch insert failed:\n", traceback.format_exc())
+                time.sleep(0.1 * 2**attempt)
+                continue
+            self.flush_ms_total += (time.perf_counter() - t0) * 1000.0
+            self.histogram[len(batch)] += 1
+            self.written += len(batch)
+            return
+        if len(batch) > 1:  # keep the good rows if one of them is bad
+            for row in batch:
+                self._write([row], retries=1)
+        else:
+            self.failed += 1
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop accepting rows, commit everything queued, wait for the writer."""
+        self._closing.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"[events] ingest still flushing ({self._q.qsize()} queued)")
+
+    def stats(self) -> dict:
+        batches = sum(self.histogram.values())
+        return {
+            "batch_max": self.batch_max,
+            "flush_ms": self.flush_s * 1000.0,
+            "queued": self._q.qsize(),
+            "queue_max": self._q.maxsize,
+            "received": self.received,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": batches,
+            "mean_batch": round(self.written / batches, 2) if batches else None,
+            "mean_flush_ms": (
+                round(self.flush_ms_total / batches, 2) if batches else None
+            ),
+        }
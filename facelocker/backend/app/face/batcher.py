@@ -0,0 +1,130 @@
+import asyncio
+import os
+import time
+from collections import Counter
+
+from .executor import (
+    FACE_QUEUE_MAX,
+    InferenceExecutor,
+    ItemFailed,
+    Saturated,
+    recognize_batch_job,
+)
+
+BATCH_WINDOW_MS = float(os.getenv("FACE_BATCH_WINDOW_MS", "5"))
+BATCH_MAX = int(os.getenv("FACE_BATCH_MAX", "8"))
+# frames waiting or in flight before submit() answers Saturated (503); by
+# default as many as the executor's job limit holds in full batches
+BATCH_QUEUE_MAX = int(
+    os.getenv("FACE_BATCH_QUEUE_MAX", str(BATCH_MAX * FACE_QUEUE_MAX))
+)
+
+
+class MicroBatcher:
+    """
+    Collects /api/recognize frames for up to `window_ms` (or until `max_batch`
+    are waiting), runs them as one inference-pool job whose recognition-model
+    call covers every detected face, then fans the results back out.
+    Lives on the event loop; batch sizes are kept as a histogram for tuning.
+    Like the executor, it sheds load instead of queueing: past `queue_max`
+    frames waiting or in flight, submit() raises Saturated.
+    """
+
+    _instance = None
+
+    def __init__(
+        self,
+        window_ms: float = BATCH_WINDOW_MS,
+        max_batch: int = BATCH_MAX,
+        queue_max: int = BATCH_QUEUE_MAX,
+    ):
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.queue_max = max(self.max_batch, queue_max)
+        self._pending: list[tuple[tuple, asyncio.Future]] = []
+        self._inflight = 0  # frames in batches that have been flushed
+        self._tasks: set[asyncio.Task] = set()
+        self._timer: asyncio.TimerHandle | None = None
+        self.histogram: Counter = Counter()
+        self.wait_ms_total = 0.0
+        self.frames = 0
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = MicroBatcher()
+        return cls._instance
+
+    async def submit(self, kind: str, raw: bytes, arg=None):
+        """
+        Queue one (kind, raw, arg) item for recognize_batch_job and await its
+        [(bbox, embedding), ...] (None if it does not decode).
+        Raises Saturated if the pool is full, ItemFailed if this item raised.
+        """
+        if len(self._pending) + self._inflight >= self.queue_max:
+            raise Saturated()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append(((kind, raw, arg), fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = (
+            self._pending[: self.max_batch],
+            self._pending[self.max_batch :],
+        )
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.window, self._flush
+            )
+        if batch:
+            self._inflight += len(batch)
+            task = asyncio.ensure_future(self._run(batch, time.perf_counter()))
+            self._tasks.add(task)  # keep a reference until it finishes
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch, flushed_at: float) -> None:
+        self.histogram[len(batch)] += 1
+        self.frames += len(batch)
+        try:
+            results = await InferenceExecutor.get().run(
+                recognize_batch_job, [item for item, _ in batch]
+            )
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        finally:
+            self._inflight -= len(batch)
+        self.wait_ms_total += (time.perf_counter() - flushed_at) * 1000.0 * len(batch)
+        for (_, fut), res in zip(batch, results):
+            if fut.done():
+                continue
+            if isinstance(res, ItemFailed):
+                fut.set_exception(res)
+            else:
+                fut.set_result(res)
+
+    def stats(self) -> dict:
+        batches = sum(self.histogram.values())
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "queue_max": self.queue_max,
+            "waiting": len(self._pending) + self._inflight,
+            "batches": batches,
+            "frames": self.frames,
+            "mean_batch": round(self.frames / batches, 3) if batches else None,
+            "mean_infer_ms": (
+                round(self.wait_ms_total / self.frames, 2) if self.frames else None
+            ),
+            "histogram": {str(k): v for k, v in sorted(self.histogram.items())},
+        }
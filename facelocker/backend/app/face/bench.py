@@ -0,0 +1,191 @@
+"""
+Offline search benchmarks on a synthetic gallery.
+
+    python -m backend.app.face.bench index --faces 100000 --queries 500
+    python -m backend.app.face.bench quant --faces 100000
+
+`index` reports recall and per-query latency of the IVF index against the
+exact flat scan (the reference answer).
+`quant` does the same for the int8 index and checks that the
+`best` decision at FACE_COS_THRESHOLD is unchanged; it exits non-zero if a
+re-ranked configuration changes any decision.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+from .index import FlatIndex, IVFIndex, QuantizedIndex
+from .matching import THRESHOLD
+
+
+def synthetic_gallery(
+    faces: int, per_user: int, dim: int = 512, seed: int = 0, sigma: float = 0.029
+):
+    """
+    Users are random unit centres; each photo is the centre plus noise, scaled
+    so two photos of the same person land around cosine 0.7 (ArcFace-like).
+    Returns (matrix, user_of_row, centres).
+    """
+    rng = np.random.default_rng(seed)
+    users = max(1, faces // per_user)
+    centres = rng.standard_normal((users, dim)).astype(np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    user_of_row = np.arange(faces) % users
+    matrix = _noisy(centres[user_of_row], rng, sigma)
+    return matrix, user_of_row, centres
+
+
+def synthetic_queries(
+    centres: np.ndarray, count: int, seed: int = 1, sigma: float = 0.029
+):
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, centres.shape[0], size=count)
+    return _noisy(centres[users], rng, sigma), users
+
+
+def _noisy(base: np.ndarray, rng, sigma: float = 0.029) -> np.ndarray:
+    out = base + sigma * rng.standard_normal(base.shape).astype(np.float32)
+    out /= np.linalg.norm(out, axis=1, keepdims=True)
+    return out.astype(np.float32)
+
+
+def _run(index, state, queries, matrix, alive, k):
+    hits, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        hits.append(index.search(state, q[None, :], matrix, alive, k)[0])
+        lat.append(time.perf_counter() - t0)
+    return hits, np.asarray(lat) * 1000.0
+
+
+def bench_index(args) -> None:
+    matrix, _, centres = synthetic_gallery(args.faces, args.per_user)
+    queries, _ = synthetic_queries(centres, args.queries)
+    alive = np.ones(matrix.shape[0], dtype=bool)
+
+    flat = FlatIndex()
+    exact, flat_ms = _run(flat, None, queries, matrix, alive, args.k)
+
+    print(f"gallery={args.faces} faces, queries={args.queries}, k={args.k}")
+    print(
+        f"{'backend':<22}{'recall@1':>10}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}"
+    )
+    print(
+        f"{'flat (exact)':<22}{1.0:>10.3f}{1.0:>10.3f}"
+        f"{np.percentile(flat_ms, 50):>10.2f}{np.percentile(flat_ms, 95):>10.2f}"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ivf = IVFIndex(path=Path(tmp) / "bench.ivf.npz", nlist=args.nlist, min_rows=0)
+        t0 = time.perf_counter()
+        ivf.reset(matrix, np.asarray([f"F_{i}" for i in range(matrix.shape[0])]))
+        print(f"ivf train: {time.perf_counter() - t0:.2f}s, lists={len(ivf.centroids)}")
+
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            approx, ms = _run(ivf, ivf.prepare(), queries, matrix, alive, args.k)
+            r1 = np.mean([a[0][0] == e[0][0] for a, e in zip(approx, exact)])
+            rk = np.mean(
+                [len(set(a[0]) & set(e[0])) / len(e[0]) for a, e in zip(approx, exact)]
+            )
+            print(
+                f"{f'ivf nprobe={nprobe}':<22}{r1:>10.3f}{rk:>10.3f}"
+                f"{np.percentile(ms, 50):>10.2f}{np.percentile(ms, 95):>10.2f}"
+            )
+
+
+def bench_quant(args) -> None:
+    matrix, user_of_row, centres = synthetic_gallery(
+        args.faces, args.per_user, sigma=args.sigma
+    )
+    # half enrolled users, half strangers, so both sides of the threshold occur
+    genuine, _ = synthetic_queries(centres, args.queries // 2, sigma=args.sigma)
+    _, _, others = synthetic_gallery(args.queries - len(genuine), 1, seed=2)
+    strangers, _ = synthetic_queries(others, len(others), seed=3, sigma=args.sigma)
+    queries = np.vstack([genuine, strangers])
+    alive = np.ones(matrix.shape[0], dtype=bool)
+
+    def decisions(hits):
+        return [
+            int(user_of_row[idx[0]]) if sims[0] >= THRESHOLD else None
+            for idx, sims in hits
+        ]
+
+    exact, flat_ms = _run(FlatIndex(), None, queries, matrix, alive, args.k)
+    ref = decisions(exact)
+    best = np.array([sims[0] for _, sims in exact])
+    near = int(np.sum(np.abs(best - THRESHOLD) < 0.02))
+    print(
+        f"gallery={args.faces} faces, queries={len(queries)}, threshold={THRESHOLD}, "
+        f"matches={sum(d is not None for d in ref)}, within 0.02 of threshold={near}"
+    )
+    print(
+        f"{'backend':<26}{'MB':>8}{'recall@1':>10}{'max err':>10}"
+        f"{'decisions':>11}{'p50 ms':>9}"
+    )
+    print(
+        f"{'flat float32 (exact)':<26}{matrix.nbytes / 2**20:>8.1f}{1.0:>10.3f}"
+        f"{0.0:>10.4f}{'same':>11}{np.percentile(flat_ms, 50):>9.2f}"
+    )
+
+    changed_after_rerank = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        # the index keeps codes only over a mapped matrix, as with snapshots
+        np.save(Path(tmp) / "gallery.npy", matrix)
+        mapped = np.load(Path(tmp) / "gallery.npy", mmap_mode="r")
+        for rerank in (0, args.rerank):
+            index = QuantizedIndex(rerank=rerank)
+            index.reset(mapped, None)
+            hits, ms = _run(index, index.prepare(), queries, mapped, alive, args.k)
+            r1 = np.mean([a[0][0] == e[0][0] for a, e in zip(hits, exact)])
+            err = max(abs(float(a[1][0]) - float(e[1][0])) for a, e in zip(hits, exact))
+            diff = sum(a != b for a, b in zip(decisions(hits), ref))
+            if rerank:
+                changed_after_rerank += diff
+            label = f"int8 rerank={rerank}"
+            print(
+                f"{label:<26}{index.nbytes(matrix.shape[0]) / 2**20:>8.1f}{r1:>10.3f}"
+                f"{err:>10.4f}{'same' if not diff else f'{diff} differ':>11}"
+                f"{np.percentile(ms, 50):>9.2f}"
+            )
+        del mapped, index
+
+    if changed_after_rerank:
+        print(f"FAIL: {changed_after_rerank} best decisions changed after re-rank")
+        sys.exit(1)
+    print("OK: re-ranked best decisions match the exact scan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("index", help="IVF recall/latency vs exact flat scan")
+    p.add_argument("--faces", type=int, default=100_000)
+    p.add_argument("--per-user", type=int, default=5)
+    p.add_argument("--queries", type=int, default=300)
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--nlist", type=int, default=0)
+    p.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    p.set_defaults(func=bench_index)
+
+    p = sub.add_parser("quant", help="int8 search vs exact float32")
+    p.add_argument("--faces", type=int, default=100_000)
+    p.add_argument("--per-user", type=int, default=5)
+    p.add_argument("--queries", type=int, default=400)
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--rerank", type=int, default=32)
+    # noise that puts same-person similarity around the default 0.75 threshold
+    p.add_argument("--sigma", type=float, default=0.025)
+    p.set_defaults(func=bench_quant)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Offline bulk enrollment from a directory tree or a zip archive.
+
+    python -m backend.app.face.bulk_import /data/onboarding/site-042
+    python -m backend.app.face.bulk_import cohort.zip --workers 8 --batch 500
+
+The source holds one folder per user: `<user_id>/*.jpg|jpeg|png` (in a zip
+the folder may sit under a top-level directory). Each photo's largest face
+is detected and embedded on a process pool, face thumbnails are stored
+under FACES_DIR/<user_id>/ (see images.py) and rows are written to the face
+store in batched transactions. Face ids are derived from each photo's bytes
+and user, so a photo that is already enrolled is skipped, and every
+committed batch's paths are appended to a checkpoint file, so an interrupted
+import resumes where it stopped. Ends with a throughput summary and failures
+by reason.
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path, PurePosixPath
+
+from .db import FACES_DIR, add_faces, get_conn, init_db
+from .executor import enroll_job, warm_engine
+from .images import ImageStore, io_pool
+from .snapshot import SNAPSHOT_ENABLED, ensure_snapshot
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+
+def scan(src: Path) -> list[tuple[str, str]]:
+    """(key, user_id) per photo; key is the path inside the source."""
+    if zipfile.is_zipfile(src):
+        with zipfile.ZipFile(src) as zf:
+            names = [n for n in zf.namelist() if not n.endswith("/")]
+    else:
+        names = [p.relative_to(src).as_posix() for p in src.rglob("*") if p.is_file()]
+    out = []
+    for name in sorted(names):
+        p = PurePosixPath(name)
+        if p.suffix.lower() in IMAGE_EXTS and len(p.parts) >= 2:
+            out.append((name, p.parent.name))
+    return out
+
+
+def face_id_for(user_id: str, raw: bytes) -> str:
+    """Derived from the photo's bytes, so another tree reusing a path is new."""
+    digest = hashlib.sha256(user_id.encode() + b"\0" + raw).hexdigest()
+    return "F_" + digest[:12]
+
+
+class Checkpoint:
+    """Append-only JSON-lines log of imported keys (one line per batch)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done: set[str] = set()
+        if path.exists():
+            for line in path.read_text().splitlines():
+                if line.strip():
+                    self.done.update(json.loads(line))
+
+    def commit(self, keys: list[str]) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps(keys) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(keys)
+
+
+def run_import(args) -> int:
+    src = Path(args.src)
+    checkpoint = Checkpoint(
+        Path(args.checkpoint or f"{src.as_posix().rstrip('/')}.import.jsonl")
+    )
+    init_db()
+    with get_conn() as c:
+        known = {r[0] for r in c.execute("SELECT face_id FROM faces")}
+
+    # resume is by path (the checkpoint); ids already in `faces` are the same
+    # photo of the same user, skipped once read
+    todo = [(key, uid) for key, uid in scan(src) if key not in checkpoint.done]
+    total = len(todo) + len(checkpoint.done)
+    print(f"{len(todo)} photos to import ({total - len(todo)} already done)")
+
+    archive = zipfile.ZipFile(src) if zipfile.is_zipfile(src) else None
+
+    def read(key: str) -> bytes:
+        return archive.read(key) if archive else (src / key).read_bytes()
+
+    failures: Counter = Counter()
+    pending_rows, pending_keys, pending_files = [], [], []
+    added = skipped = 0
+    t0 = time.perf_counter()
+
+    def flush() -> None:
+        nonlocal added
+        store = ImageStore.get()
+        list(io_pool().map(lambda a: store.save(*a), pending_files))
+        added += add_faces(pending_rows)
+        checkpoint.commit(pending_keys)
+        for pending in (pending_rows, pending_keys, pending_files):
+            pending.clear()
+        rate = (added + sum(failures.values())) / (time.perf_counter() - t0)
+        print(f"  {added} added, {sum(failures.values())} failed ({rate:.1f} img/s)")
+
+    # each process runs one job at a time: one lane, and its share of the cores
+    os.environ["FACE_ENGINES"] = "1"
+    if os.getenv("FACE_INTRA_THREADS", "0") == "0":
+        cores = max(1, (os.cpu_count() or 1) // args.workers)
+        os.environ["FACE_INTRA_THREADS"] = str(cores)
+    pool = ProcessPoolExecutor(
+        args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=warm_engine,
+    )
+    inflight: dict = {}
+    queue = iter(todo)
+    try:
+        while True:
+            # keep a few jobs per worker queued so no process idles
+            while len(inflight) < 4 * args.workers:
+                nxt = next(queue, None)
+                if nxt is None:
+                    break
+                key, uid = nxt
+                try:
+                    raw = read(key)
+                except Exception:
+                    failures["unreadable"] += 1
+                    continue
+                fid = face_id_for(uid, raw)
+                if fid in known:  # enrolled before, or a duplicate in this tree
+                    skipped += 1
+                    continue
+                known.add(fid)
+                inflight[pool.submit(enroll_job, raw)] = (key, uid, fid, raw)
+            if not inflight:
+                break
+            finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                key, uid, fid, raw = inflight.pop(fut)
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    res = {"error": type(e).__name__}
+                if "error" in res:
+                    failures[res["error"]] += 1
+                    continue
+                path = str(FACES_DIR / uid / f"{fid}.jpg")
+                pending_rows.append((fid, uid, res["embedding"], path, res["quality"]))
+                pending_keys.append(key)
+                pending_files.append((path, res["crop"], raw))
+            if len(pending_rows) >= args.batch:
+                flush()
+        if pending_rows:
+            flush()
+    finally:
+        pool.shutdown(cancel_futures=True)
+        if archive:
+            archive.close()
+
+    elapsed = time.perf_counter() - t0
+    processed = added + sum(failures.values())
+    print(
+        f"done: {added} added, {skipped} already enrolled, "
+        f"{sum(failures.values())} failed in {elapsed:.1f}s "
+        f"({processed / elapsed if elapsed else 0:.1f} images/s, "
+        f"{args.workers} workers)"
+    )
+    for reason, n in failures.most_common():
+        print(f"  {reason}: {n}")
+
+    if added and SNAPSHOT_ENABLED:
+        # running servers catch up without a restart (far-behind ones adopt this)
+        print(f"published gallery snapshot v{ensure_snapshot().version}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("src", help="directory of <user_id>/ folders, or a .zip")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch", type=int, default=200, help="rows per transaction")
+    parser.add_argument(
+        "--checkpoint", help="progress file (default: <src>.import.jsonl)"
+    )
+    args = parser.parse_args()
+    args.workers = max(1, args.workers)
+    sys.exit(run_import(args))
+
+
+if __name__ == "__main__":
+    main()
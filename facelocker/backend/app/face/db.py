@@ -1,9 +1,10 @@
 from pathlib import Path as PathlibPath
 import os
 import sqlite3
+import threading
 from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict, Any
+from typing import Any, Iterator
 import numpy as np
 import io
 
@@ -12,16 +13,81 @@ DB_PATH = os.getenv("DB_PATH", "/app/data/facelocker.db")
 FACES_DIR = PathlibPath(os.getenv("FACES_DIR", "/app/data/faces")).resolve()
 FACES_DIR.mkdir(parents=True, exist_ok=True)
 
+EMB_DIM = 512
+# On-disk embedding encoding for new rows: float32 | float16 | int8. Existing
+# rows keep theirs (float16/int8 are lossy, so nothing is re-encoded for you).
+EMB_DTYPE = os.getenv("FACE_EMB_DTYPE", "float32").lower()
+# PRAGMA user_version: 0 = np.save blobs (legacy), 2 = headerless raw blobs,
+# 3 = + face_changes log
+SCHEMA_VERSION = 3
 
-@contextmanager
-def get_conn():
+
+# Per-thread connection settings (pragmas are applied once per connection)
+DB_MMAP_MB = int(os.getenv("FACE_DB_MMAP_MB", "256"))
+DB_CACHE_MB = int(os.getenv("FACE_DB_CACHE_MB", "64"))
+DB_BUSY_MS = int(os.getenv("FACE_DB_BUSY_MS", "5000"))
+DB_CACHED_STATEMENTS = 256  # sqlite3's per-connection prepared-statement cache
+
+_local = threading.local()
+# every pooled connection by id(), with the thread that owns it
+_open: dict[int, tuple[threading.Thread, sqlite3.Connection]] = {}
+_open_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
     Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=DB_BUSY_MS / 1000.0,
+        cached_statements=DB_CACHED_STATEMENTS,
+        check_same_thread=False,  # only close_conns() touches it from elsewhere
+    )
     conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")  # durable with WAL, far fewer fsyncs
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_MB * 1024 * 1024};")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_MB * 1024};")  # negative = KiB
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_MS};")
+    return conn
+
+
+@contextmanager
+def get_conn():
+    """
+    This thread's connection (opened on first use and kept, so its statement
+    cache stays warm). The outermost `with` commits, or rolls back on error.
+    A connection lives as long as its thread: ones left by exited threads are
+    closed when the next connection opens, and close_conns() (app shutdown)
+    closes them all.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or id(conn) not in _open:
+        conn = _local.conn = _connect()
+        _local.depth = 0
+        with _open_lock:
+            for key, (owner, old) in list(_open.items()):
+                if not owner.is_alive():
+                    del _open[key]
+                    old.close()
+            _open[id(conn)] = (threading.current_thread(), conn)
+    _local.depth += 1
     try:
         yield conn
+        if _local.depth == 1:
+            conn.commit()
+    except BaseException:
+        if _local.depth == 1:
+            conn.rollback()
+        raise
     finally:
-        conn.commit()
+        _local.depth -= 1
+
+
+def close_conns() -> None:
+    """Close every thread's pooled connection (they reopen on next use)."""
+    with _open_lock:
+        conns = [conn for _, conn in _open.values()]
+        _open.clear()
+    for conn in conns:
         conn.close()
 
 
@@ -35,7 +101,44 @@ CREATE TABLE IF NOT EXISTS faces (
   created_at TEXT DEFAULT (datetime('now'))
 );
 CREATE INDEX IF NOT EXISTS idx_faces_user ON faces(user_id);
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta(key, value) VALUES ('faces_version', 0);
+CREATE TABLE IF NOT EXISTS face_changes (
+  rev INTEGER PRIMARY KEY,
+  face_id TEXT NOT NULL,
+  user_id TEXT NOT NULL,
+  op TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_face_changes_face ON face_changes(face_id);
+"""
+
+# faces_version counts every write to `faces` (kept by triggers, so writers
+# outside this module are counted too); gallery snapshots are keyed by it.
+# Each write also leaves one face_changes row per face_id ('upsert' or
+# 'delete'), at rev = the new faces_version, replacing that face's older row:
+# the log stays one row per face ever enrolled and "since rev" is exact.
+_LOG_CHANGE = """
+  UPDATE meta SET value = value + 1 WHERE key = 'faces_version';
+  DELETE FROM face_changes WHERE face_id = {row}.face_id;
+  INSERT INTO face_changes(rev, face_id, user_id, op) VALUES (
+    (SELECT value FROM meta WHERE key = 'faces_version'),
+    {row}.face_id, {row}.user_id, '{op}'
+  );
 """
+TRIGGERS = [
+    f"""
+CREATE TRIGGER IF NOT EXISTS faces_change_{event.lower()} AFTER {event} ON faces
+BEGIN{_LOG_CHANGE.format(row=row, op=op)}END
+"""
+    for event, row, op in (
+        ("INSERT", "NEW", "upsert"),
+        ("UPDATE", "NEW", "upsert"),
+        ("DELETE", "OLD", "delete"),
+    )
+]
 
 
 def init_db():
@@ -44,25 +147,100 @@ def init_db():
             s = stmt.strip()
             if s:
                 c.execute(s)
+        for trig in TRIGGERS:
+            c.execute(trig)
+        _migrate(c)
+
+
+def _migrate(c) -> None:
+    """
+    One-time upgrades, tracked by PRAGMA user_version:
+      2: rewrite legacy np.save embedding blobs as raw float32 blobs, in place
+         (lossless whatever FACE_EMB_DTYPE says)
+      3: replace the counter-only triggers and log existing faces as upserts
+    """
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    if version < 2:
+        rows = c.execute("SELECT face_id, embedding FROM faces").fetchall()
+        c.executemany(
+            "UPDATE faces SET embedding=? WHERE face_id=?",
+            [
+                (_np_to_bytes(_bytes_to_np(blob), "float32"), fid)
+                for fid, blob in rows
+                if blob[:6] == _NPY_MAGIC
+            ],
+        )
+    if version < 3:
+        for event in ("insert", "update", "delete"):
+            c.execute(f"DROP TRIGGER IF EXISTS faces_version_{event}")
+        # revs continue after the current faces_version (snapshots rely on it)
+        base = faces_version(c)
+        missing = c.execute(
+            "SELECT face_id, user_id FROM faces "
+            "WHERE face_id NOT IN (SELECT face_id FROM face_changes) ORDER BY rowid"
+        ).fetchall()
+        c.executemany(
+            "INSERT INTO face_changes(rev, face_id, user_id, op) VALUES(?,?,?,'upsert')",
+            [(base + i + 1, fid, uid) for i, (fid, uid) in enumerate(missing)],
+        )
+        c.execute(
+            "UPDATE meta SET value=? WHERE key='faces_version'", (base + len(missing),)
+        )
+    c.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
 
 
 # --- helpers ---
 
+_NPY_MAGIC = b"\x93NUMPY"
+_RAW_SIZES = (4 * EMB_DIM, 2 * EMB_DIM, EMB_DIM + 4)  # float32, float16, int8+scale
 
-def _np_to_bytes(arr: np.ndarray) -> bytes:
-    buf = io.BytesIO()
-    np.save(buf, arr.astype("float32"))
-    return buf.getvalue()
+
+def _np_to_bytes(arr: np.ndarray, dtype: str | None = None) -> bytes:
+    """
+    Headerless little-endian blob: float32 (2 KB), float16 (1 KB) or int8
+    with a leading float32 scale (516 B). The format follows from the length.
+    """
+    v = np.asarray(arr, dtype=np.float32).reshape(-1)
+    dtype = dtype or EMB_DTYPE
+    if dtype == "float16":
+        return v.astype("<f2").tobytes()
+    if dtype == "int8":
+        scale = float(np.abs(v).max()) / 127.0 or 1.0
+        q = np.clip(np.rint(v / scale), -127, 127).astype(np.int8)
+        return np.float32(scale).astype("<f4").tobytes() + q.tobytes()
+    return v.astype("<f4").tobytes()
 
 
 def _bytes_to_np(b: bytes) -> np.ndarray:
-    buf = io.BytesIO(b)
-    return np.load(buf)
+    if b[:6] == _NPY_MAGIC:  # legacy np.save blob
+        return np.load(io.BytesIO(b)).astype(np.float32).reshape(-1)
+    return _decode_rows([b], len(b))[0]
+
+
+def _decode_rows(blobs: list[bytes], size: int) -> np.ndarray:
+    """Decode equal-length raw blobs with one np.frombuffer over the joined buffer."""
+    buf = b"".join(blobs)
+    n = len(blobs)
+    if size == 4 * EMB_DIM:
+        return np.frombuffer(buf, dtype="<f4").reshape(n, EMB_DIM).astype(np.float32)
+    if size == 2 * EMB_DIM:
+        return np.frombuffer(buf, dtype="<f2").reshape(n, EMB_DIM).astype(np.float32)
+    if size == EMB_DIM + 4:
+        raw = np.frombuffer(buf, dtype=np.uint8).reshape(n, EMB_DIM + 4)
+        scales = raw[:, :4].copy().view("<f4").astype(np.float32)
+        return raw[:, 4:].view(np.int8).astype(np.float32) * scales
+    raise ValueError(f"unknown embedding blob size {size}")
 
 
 def _safe_unlink(p: PathlibPath) -> None:  # type annotation
+    if p == PathlibPath(""):  # rows moved from `embeddings` have no image
+        return
     try:
-        p.unlink(missing_ok=True)
+        from .images import ImageStore  # lazy: images imports us
+
+        ImageStore.get().release(p)  # also drops the blob once unreferenced
     except Exception:
         pass
 
@@ -76,6 +254,18 @@ def _image_url(user_id: str, face_id: str) -> str:
     return f"/static/faces/{user_id}/{face_id}.jpg"
 
 
+def _thumb_url(face_id: str) -> str:
+    """Cached list-view variant; see GET /api/faces/{face_id}/thumb."""
+    return f"/api/faces/{face_id}/thumb"
+
+
+def _gallery():
+    """The in-memory gallery if this process has built one (imported lazily: gallery imports us)."""
+    from .gallery import Gallery
+
+    return Gallery.loaded_instance()
+
+
 # --- CRUD ---
 
 
@@ -91,6 +281,34 @@ def add_face(
             "INSERT INTO faces(face_id,user_id,embedding,image_path,quality) VALUES(?,?,?,?,?)",
             (face_id, user_id, _np_to_bytes(embedding), image_path, quality),
         )
+        version = faces_version(c)
+    g = _gallery()
+    if g is not None:
+        g.add(face_id, user_id, embedding, version=version)
+
+
+def add_faces(
+    items: list[tuple[str, str, np.ndarray, str, float | None]],
+) -> int:
+    """
+    Insert many (face_id, user_id, embedding, image_path, quality) rows in
+    one transaction, then append them to the gallery together.
+    """
+    if not items:
+        return 0
+    with get_conn() as c:
+        c.executemany(
+            "INSERT INTO faces(face_id,user_id,embedding,image_path,quality) VALUES(?,?,?,?,?)",
+            [
+                (fid, uid, _np_to_bytes(emb), path, q)
+                for fid, uid, emb, path, q in items
+            ],
+        )
+        version = faces_version(c)
+    g = _gallery()
+    if g is not None:
+        g.add_many([(fid, uid, emb) for fid, uid, emb, _, _ in items], version)
+    return len(items)
 
 
 def delete_face(face_id: str) -> int:
@@ -106,7 +324,12 @@ def delete_face(face_id: str) -> int:
             img_path = Path(row[0])
             _safe_unlink(img_path)
         cur = c.execute("DELETE FROM faces WHERE face_id=?", (face_id,))
-        return cur.rowcount
+        n = cur.rowcount
+        version = faces_version(c)
+    g = _gallery()
+    if g is not None and n:
+        g.remove([face_id], version=version)
+    return n
 
 
 def delete_faces_by_user(user_id: str) -> tuple[int, list[str]]:
@@ -125,6 +348,10 @@ def delete_faces_by_user(user_id: str) -> tuple[int, list[str]]:
             _safe_unlink(PathlibPath(img))
 
         c.execute("DELETE FROM faces WHERE user_id=?", (user_id,))
+        version = faces_version(c)
+    g = _gallery()
+    if g is not None and deleted_ids:
+        g.remove(deleted_ids, version=version)
     return (len(deleted_ids), deleted_ids)
 
 
@@ -151,6 +378,7 @@ def list_faces(user_id: str | None = None) -> list[dict[str, Any]]:
                     "user_id": uid,
                     "image_path": img_path,
                     "image_url": _image_url(uid, face_id),  # <— added
+                    "thumb_url": _thumb_url(face_id),
                     "quality": quality,
                     "created_at": created_at,
                 }
@@ -158,8 +386,129 @@ def list_faces(user_id: str | None = None) -> list[dict[str, Any]]:
         return out
 
 
-def all_embeddings() -> list[tuple[str, str, np.ndarray]]:
+def face_image_path(face_id: str) -> str | None:
     with get_conn() as c:
-        cur = c.execute("SELECT face_id,user_id,embedding FROM faces")
-        rows = cur.fetchall()
-        return [(r[0], r[1], _bytes_to_np(r[2])) for r in rows]
+        row = c.execute(
+            "SELECT image_path FROM faces WHERE face_id=?", (face_id,)
+        ).fetchone()
+    return row[0] if row and row[0] else None
+
+
+def faces_version(c=None) -> int:
+    """Current faces_version counter (see TRIGGERS)."""
+    if c is None:
+        with get_conn() as c:
+            return faces_version(c)
+    row = c.execute("SELECT value FROM meta WHERE key='faces_version'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def load_matrix() -> tuple[list[str], list[str], np.ndarray]:
+    """
+    Bulk load every embedding into one preallocated float32 (N, EMB_DIM)
+    matrix. Rows are decoded per blob format, one np.frombuffer per format.
+    Returns (face_ids, user_ids, matrix).
+    """
+    _, face_ids, user_ids, matrix = load_matrix_versioned()
+    return face_ids, user_ids, matrix
+
+
+def load_matrix_versioned() -> tuple[int, list[str], list[str], np.ndarray]:
+    """load_matrix() plus the faces_version it reflects, read in one transaction."""
+    with get_conn() as c:
+        if not c.in_transaction:
+            c.execute("BEGIN")  # version and rows from one read snapshot
+        version = faces_version(c)
+        rows = c.execute("SELECT face_id,user_id,embedding FROM faces").fetchall()
+    face_ids = [r[0] for r in rows]
+    user_ids = [r[1] for r in rows]
+    matrix = np.empty((len(rows), EMB_DIM), dtype=np.float32)
+
+    blobs = [r[2] for r in rows]
+    sizes = {len(b) for b in blobs}
+    if len(sizes) == 1 and next(iter(sizes)) in _RAW_SIZES:
+        matrix[:] = _decode_rows(blobs, sizes.pop())  # common case: one format
+    else:
+        groups: dict[int, list[int]] = {}
+        for i, b in enumerate(blobs):
+            groups.setdefault(len(b), []).append(i)
+        for size, idx in groups.items():
+            if size in _RAW_SIZES:
+                matrix[idx] = _decode_rows([blobs[i] for i in idx], size)
+            else:
+                for i in idx:
+                    matrix[i] = _bytes_to_np(blobs[i])
+    return version, face_ids, user_ids, matrix
+
+
+def iter_embeddings(
+    user_id: str | None = None, batch: int = 1024
+) -> Iterator[list[tuple[str, str, np.ndarray]]]:
+    """
+    Yield [(face_id, user_id, float32 vector), ...] in rowid order, `batch`
+    rows at a time. Each batch is its own short query (keyset on rowid), so
+    no cursor is held open between yields and callers may resume a batch on
+    another thread (e.g. a streaming response).
+    """
+    sql = "SELECT rowid,face_id,user_id,embedding FROM faces WHERE rowid>?"
+    args: tuple = ()
+    if user_id is not None:
+        sql += " AND user_id=?"
+        args = (user_id,)
+    sql += " ORDER BY rowid LIMIT ?"
+    last = 0
+    while True:
+        with get_conn() as c:
+            rows = c.execute(sql, (last, *args, batch)).fetchall()
+        if not rows:
+            return
+        last = rows[-1][0]
+        yield [(r[1], r[2], _bytes_to_np(r[3])) for r in rows]
+        if len(rows) < batch:
+            return
+
+
+def changes_since(
+    since: int, limit: int = 1000
+) -> tuple[int, list[tuple[int, str, str, np.ndarray | None]]]:
+    """
+    Change-log entries after revision `since`, oldest first, at most `limit`:
+    (current_rev, [(rev, face_id, user_id, vector or None for a delete), ...]).
+    Both are read in one transaction, so they agree.
+    """
+    with get_conn() as c:
+        if not c.in_transaction:
+            c.execute("BEGIN")
+        current = faces_version(c)
+        rows = c.execute(
+            "SELECT ch.rev, ch.face_id, ch.user_id, ch.op, f.embedding "
+            "FROM face_changes ch LEFT JOIN faces f ON f.face_id = ch.face_id "
+            "WHERE ch.rev > ? ORDER BY ch.rev LIMIT ?",
+            (since, limit),
+        ).fetchall()
+    return current, [
+        (rev, fid, uid, _bytes_to_np(blob) if op == "upsert" and blob else None)
+        for rev, fid, uid, op, blob in rows
+    ]
+
+
+def import_embeddings(items: list[tuple[str, str, np.ndarray]]) -> int:
+    """
+    Insert (face_id, user_id, vector) rows that have no enrollment photo
+    (image_path ''), skipping face_ids that already exist.
+    """
+    with get_conn() as c:
+        n = c.executemany(
+            "INSERT OR IGNORE INTO faces(face_id,user_id,embedding,image_path) "
+            "VALUES(?,?,?,'')",
+            [(fid, uid, _np_to_bytes(v)) for fid, uid, v in items],
+        ).rowcount
+    g = _gallery()
+    if g is not None and n:
+        g.load()
+    return n
+
+
+def all_embeddings() -> list[tuple[str, str, np.ndarray]]:
+    face_ids, user_ids, matrix = load_matrix()
+    return list(zip(face_ids, user_ids, matrix))
@@ -1,16 +1,79 @@
 import os
+import queue
 import threading
+from contextlib import contextmanager
 from pathlib import Path
 import numpy as np
 
 
+# Inference executor (see executor.py); here because the lane count follows it
+FACE_WORKERS = int(os.getenv("FACE_WORKERS", str(min(4, os.cpu_count() or 1))))
+FACE_WORKER_KIND = os.getenv("FACE_WORKER_KIND", "thread").lower()  # thread | process
+# Inference lanes: independent engines, each with its own ORT sessions.
+# FACE_ENGINES is the total across the executor; the default gives every
+# worker its own lane so concurrent jobs never queue for one.
+FACE_ENGINES = int(os.getenv("FACE_ENGINES", str(FACE_WORKERS)))
+# ORT intra-op threads per lane; 0 = auto (see intra_threads)
+FACE_INTRA_THREADS = int(os.getenv("FACE_INTRA_THREADS", "0"))
+FACE_INTER_THREADS = int(os.getenv("FACE_INTER_THREADS", "0"))
+FACE_PIN_CPUS = os.getenv("FACE_PIN_CPUS", "false").lower() == "true"
+# Default detector input (square); requests may pick another size per call
+FACE_DET_SIZE = int(os.getenv("FACE_DET_SIZE", "640"))
+DET_SIZE_MIN, DET_SIZE_MAX = 128, 1280
+
+
+def check_det_size(size: int | None) -> int | None:
+    """Validate a per-request detector size (multiple of 32); None = default."""
+    if size is None:
+        return None
+    if size % 32 or not DET_SIZE_MIN <= size <= DET_SIZE_MAX:
+        raise ValueError(
+            f"det_size must be a multiple of 32 in [{DET_SIZE_MIN}, {DET_SIZE_MAX}]"
+        )
+    return size
+
+
+def intra_threads(cpus=None) -> int:
+    """
+    FACE_INTRA_THREADS, else a pinned lane's own CPUs, else this box's CPUs
+    split across every lane of every uvicorn worker (WEB_CONCURRENCY): ORT's
+    default of one thread per core in each lane oversubscribes the cores as
+    soon as several lanes run at once.
+    """
+    if FACE_INTRA_THREADS:
+        return FACE_INTRA_THREADS
+    if cpus:
+        return len(cpus)
+    if hasattr(os, "sched_getaffinity"):
+        avail = len(os.sched_getaffinity(0))
+    else:
+        avail = os.cpu_count() or 1
+    web = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return max(1, avail // (max(1, FACE_ENGINES) * web))
+
+
+def lanes_per_process(total: int = FACE_ENGINES) -> int:
+    """Process workers each build their own pool: split the total between them."""
+    if FACE_WORKER_KIND == "process":
+        return max(1, -(-total // max(1, FACE_WORKERS)))
+    return max(1, total)
+
+
+def _pin_thread(cpus) -> None:
+    # Linux: pid 0 = the calling thread; ORT pool threads inherit it on creation
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+
 class _FaceEngine:
     _instance = None
     _lock = threading.Lock()
 
-    def __init__(self):
+    def __init__(self, cpus: list[int] | None = None):
         from insightface.app import FaceAnalysis
 
+        self.cpus = cpus
+
         models_dir = os.getenv("FACE_MODELS_DIR")  # may be None/empty
         provider = os.getenv("FACE_PROVIDER", "CPU").upper()
         pack = os.getenv("FACE_PACK", "buffalo_sc")
@@ -20,33 +83,148 @@ class _FaceEngine:
         else:
             providers = ["CPUExecutionProvider"]
 
+        # Only detection + recognition are used; skip any other models in the pack
+        modules = ["detection", "recognition"]
+
         # Only pass `root` when it’s a valid path
         if models_dir and models_dir.strip():
             Path(models_dir).mkdir(parents=True, exist_ok=True)
-            self.app = FaceAnalysis(name=pack, root=models_dir, providers=providers)
+            self.app = FaceAnalysis(
+                name=pack, root=models_dir, allowed_modules=modules, providers=providers
+            )
         else:
-            self.app = FaceAnalysis(name=pack, providers=providers)
+            self.app = FaceAnalysis(
+                name=pack, allowed_modules=modules, providers=providers
+            )
 
-        self.app.prepare(ctx_id=0, det_size=(640, 640))
+        self.app.prepare(ctx_id=0, det_size=(FACE_DET_SIZE, FACE_DET_SIZE))
+        self._tune_sessions(providers, intra_threads(cpus), FACE_INTER_THREADS)
         self.dim = 512
 
+    def _tune_sessions(self, providers, intra: int, inter: int) -> None:
+        """Recreate each model's ORT session with explicit threading options."""
+        if not intra and not inter:
+            return
+        import onnxruntime as ort
+
+        so = ort.SessionOptions()
+        if intra:
+            so.intra_op_num_threads = intra
+        if inter:
+            so.inter_op_num_threads = inter
+            if inter > 1:
+                so.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        for model in self.app.models.values():
+            model.session = ort.InferenceSession(
+                model.model_file, sess_options=so, providers=providers
+            )
+
     @classmethod
     def get(cls):
+        """First lane of the engine pool (kept for single-engine callers)."""
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
-                    cls._instance = _FaceEngine()
+                    cls._instance = EnginePool.get().engines[0]
         return cls._instance
 
-    def embed(self, image_bgr: np.ndarray):
-        faces = self.app.get(image_bgr)
-        if not faces:
+    def embed(self, image_bgr: np.ndarray, det_size: int | None = None):
+        bboxes, kpss = self.detect(image_bgr, det_size)
+        if bboxes.shape[0] == 0:
             return []
-        out = []
-        for f in faces:
-            emb = f.normed_embedding
-            out.append((f.bbox.astype(float).tolist(), emb.astype(np.float32)))
-        return out
+        crops = [self.align(image_bgr, kps) for kps in kpss]
+        embs = self.embed_aligned(crops)
+        return [(b[0:4].astype(float).tolist(), e) for b, e in zip(bboxes, embs)]
+
+    # --- split pipeline (lets callers batch the recognition model) ---
+
+    def detect(self, image_bgr: np.ndarray, det_size: int | None = None):
+        """Face boxes (N, 5: x1, y1, x2, y2, score) and 5-point landmarks (N, 5, 2)."""
+        size = (det_size, det_size) if det_size else None
+        return self.app.det_model.detect(
+            image_bgr, input_size=size, max_num=0, metric="default"
+        )
+
+    def align(self, image_bgr: np.ndarray, kps: np.ndarray) -> np.ndarray:
+        """ArcFace-normalized 112x112 crop for one face."""
+        from insightface.utils import face_align
+
+        return face_align.norm_crop(image_bgr, landmark=kps, image_size=112)
+
+    def embed_aligned(self, crops: list[np.ndarray]) -> np.ndarray:
+        """L2-normalized embeddings for aligned crops, in one ONNX Runtime call."""
+        if not crops:
+            return np.empty((0, self.dim), dtype=np.float32)
+        feats = self.app.models["recognition"].get_feat(list(crops))
+        feats = np.asarray(feats, dtype=np.float32).reshape(len(crops), -1)
+        return feats / np.linalg.norm(feats, axis=1, keepdims=True)
+
+
+class EnginePool:
+    """
+    Independent engine instances ("lanes"), FACE_ENGINES in all; with
+    FACE_WORKER_KIND=process each worker process holds its share (see
+    lanes_per_process). Inference jobs lease a free lane, so concurrent
+    workers never share one set of ORT sessions.
+    With FACE_PIN_CPUS=true the process's CPUs are split evenly across lanes;
+    each lane's sessions are created, and its jobs run, pinned to its share.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, size: int | None = None, pin: bool = FACE_PIN_CPUS):
+        size = lanes_per_process() if size is None else size
+        size = max(1, size)
+        lanes = [None] * size
+        if pin and hasattr(os, "sched_getaffinity"):
+            cpus = sorted(os.sched_getaffinity(0))
+            lanes = [cpus[i::size] or None for i in range(size)]
+
+        self.engines: list[_FaceEngine] = []
+        self._free: queue.Queue = queue.Queue()
+        for cpus in lanes:
+            eng = self._build(cpus)
+            self.engines.append(eng)
+            self._free.put(eng)
+
+    @staticmethod
+    def _build(cpus) -> "_FaceEngine":
+        if not cpus:
+            return _FaceEngine()
+        # build on a pinned helper thread so ORT's intra-op threads inherit the mask
+        box = {}
+
+        def _make():
+            try:
+                _pin_thread(cpus)
+                box["eng"] = _FaceEngine(cpus=cpus)
+            except BaseException as e:  # re-raised on the caller thread
+                box["err"] = e
+
+        t = threading.Thread(target=_make, name="face-engine-init")
+        t.start()
+        t.join()
+        if "err" in box:
+            raise box["err"]
+        return box["eng"]
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = EnginePool()
+        return cls._instance
+
+    @contextmanager
+    def lease(self):
+        eng = self._free.get()
+        try:
+            _pin_thread(eng.cpus)
+            yield eng
+        finally:
+            self._free.put(eng)
 
 
 def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
@@ -0,0 +1,220 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import cv2
+
+from .engine import FACE_WORKER_KIND, FACE_WORKERS, EnginePool
+from .images import face_crop
+
+FACE_QUEUE_MAX = int(os.getenv("FACE_QUEUE_MAX", "32"))  # running + waiting jobs
+FACE_RETRY_AFTER = int(os.getenv("FACE_RETRY_AFTER", "1"))  # seconds, for 503s
+
+
+class Saturated(Exception):
+    """Raised when the inference queue is full."""
+
+
+class ItemFailed(Exception):
+    """One micro-batch item raised; the rest of its batch still ran."""
+
+
+class InferenceExecutor:
+    """
+    Runs decode + detection/embedding off the asyncio event loop on a thread
+    or process pool. At most `max_pending` jobs may be running or queued;
+    beyond that `run()` raises Saturated instead of piling up latency.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        workers: int = FACE_WORKERS,
+        kind: str = FACE_WORKER_KIND,
+        max_pending: int = FACE_QUEUE_MAX,
+    ):
+        self.workers = max(1, workers)
+        self.kind = kind
+        self.max_pending = max(self.workers, max_pending)
+        self.pending = 0
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        if kind == "process":
+            # spawn: never fork a parent that already holds ONNX Runtime threads
+            self._pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_engine,
+            )
+        else:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="face")
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = InferenceExecutor()
+        return cls._instance
+
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise Saturated()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, fn, *args)
+        finally:
+            self.pending -= 1
+            self._slots.release()
+
+    def warm(self) -> None:
+        # process workers warm themselves via the pool initializer
+        if self.kind != "process":
+            warm_engine()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ---- jobs (module-level so process workers can unpickle them) ----
+
+
+def warm_engine() -> None:
+    EnginePool.get()
+
+
+def decode_image(raw: bytes):
+    return cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+
+
+def recognize_job(raw: bytes, det_size: int | None = None):
+    """Decode + detect/embed every face. None if the image does not decode."""
+    bgr = decode_image(raw)
+    if bgr is None:
+        return None
+    with EnginePool.get().lease() as eng:
+        return eng.embed(bgr, det_size)
+
+
+def detect_job(raw: bytes, det_size: int | None = None):
+    """
+    Detection only (no embeddings): list of {"bbox", "score", "landmarks"}.
+    None if the image does not decode.
+    """
+    bgr = decode_image(raw)
+    if bgr is None:
+        return None
+    with EnginePool.get().lease() as eng:
+        bboxes, kpss = eng.detect(bgr, det_size)
+    out = []
+    for i in range(bboxes.shape[0]):
+        out.append(
+            {
+                "bbox": [float(v) for v in bboxes[i, 0:4]],
+                "score": float(bboxes[i, 4]),
+                "landmarks": (
+                    kpss[i].astype(float).tolist() if kpss is not None else None
+                ),
+            }
+        )
+    return out
+
+
+def enroll_job(raw: bytes) -> dict:
+    """
+    Decode and embed the largest face.
+    Returns {"error": code} or {"bbox", "embedding", "quality", "crop"}; crop
+    is the downscaled face thumbnail for ImageStore (written off this path).
+    """
+    bgr = decode_image(raw)
+    if bgr is None:
+        return {"error": "invalid_image"}
+
+    with EnginePool.get().lease() as eng:
+        faces = eng.embed(bgr)
+    if not faces:
+        return {"error": "no_face_detected"}
+
+    # choose largest box
+    faces.sort(key=lambda t: (t[0][2] - t[0][0]) * (t[0][3] - t[0][1]), reverse=True)
+    bbox, emb = faces[0]
+    # simple quality metric: box area / image area
+    h, w = bgr.shape[:2]
+    area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+    quality = float(max(0.0, min(1.0, area / float(w * h))))
+    return {
+        "bbox": bbox,
+        "embedding": emb,
+        "quality": quality,
+        "crop": face_crop(bgr, bbox),
+    }
+
+
+ALIGNED_SIZE = 112  # ArcFace input: raw aligned faces are 112x112x3 uint8 BGR
+
+
+def decode_aligned(raw: bytes):
+    """Raw 112x112x3 BGR buffer -> image, or None if the size is wrong."""
+    if len(raw) != ALIGNED_SIZE * ALIGNED_SIZE * 3:
+        return None
+    return np.frombuffer(raw, np.uint8).reshape(ALIGNED_SIZE, ALIGNED_SIZE, 3)
+
+
+def _prepare_item(eng, kind: str, raw: bytes, arg):
+    """
+    Turn one batch item into (bboxes, aligned crops), or None if it does not
+    decode. Kinds:
+      "frame":   full camera image, arg = det_size -> detect + align
+      "crop":    client-cropped face image, arg = 5x2 landmarks -> align only
+      "aligned": raw 112x112 BGR buffer -> used as-is
+    """
+    if kind == "aligned":
+        img = decode_aligned(raw)
+        if img is None:
+            return None
+        return [[0.0, 0.0, float(ALIGNED_SIZE), float(ALIGNED_SIZE)]], [img]
+
+    bgr = decode_image(raw)
+    if bgr is None:
+        return None
+    if kind == "crop":
+        h, w = bgr.shape[:2]
+        kps = np.asarray(arg, dtype=np.float32).reshape(5, 2)
+        return [[0.0, 0.0, float(w), float(h)]], [eng.align(bgr, kps)]
+
+    bboxes, kpss = eng.detect(bgr, arg)
+    boxes = [bboxes[j, 0:4].astype(float).tolist() for j in range(bboxes.shape[0])]
+    return boxes, [eng.align(bgr, kpss[j]) for j in range(bboxes.shape[0])]
+
+
+def recognize_batch_job(items: list[tuple[str, bytes, object]]) -> list:
+    """
+    Micro-batch variant of recognize_job over (kind, raw, arg) items (see
+    _prepare_item): detect/align each input, then embed every aligned crop of
+    the whole batch in a single recognition-model call. Returns one entry per
+    input (None if it does not decode, an ItemFailed if preparing it raised).
+    """
+    crops, owners, out = [], [], []
+    with EnginePool.get().lease() as eng:
+        for i, (kind, raw, arg) in enumerate(items):
+            try:
+                prepared = _prepare_item(eng, kind, raw, arg)
+            except Exception as e:  # fail this input only, not its batch
+                out.append(ItemFailed(f"{type(e).__name__}: {e}"))
+                continue
+            if prepared is None:
+                out.append(None)
+                continue
+            out.append([])
+            for bbox, crop in zip(*prepared):
+                crops.append(crop)
+                owners.append((i, bbox))
+
+        embs = eng.embed_aligned(crops)
+    for (i, bbox), emb in zip(owners, embs):
+        out[i].append((bbox, emb))
+    return out
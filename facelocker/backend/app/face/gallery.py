@@ -0,0 +1,307 @@
+import threading
+import numpy as np
+
+from .db import faces_version, load_matrix_versioned
+from .index import make_index
+from .prototypes import MATCH_MODE, PrototypeSet
+from .snapshot import SNAPSHOT_ENABLED, Snapshot, SnapshotSync, ensure_snapshot
+
+# compact once this share of rows are tombstones (and at least a few of them)
+COMPACT_RATIO = 0.25
+COMPACT_MIN = 64
+
+
+class Gallery:
+    """
+    Process-resident face gallery.
+    Embeddings live in one contiguous float32 (capacity, dim) matrix with
+    parallel face_id / user_id arrays, so a query is a single matmul +
+    argpartition. Enrolls append a row, deletes tombstone it; the matrix is
+    compacted once enough tombstones pile up. Every change bumps `generation`.
+    Search goes through a pluggable index (FACE_INDEX=flat|ivf, see index.py),
+    or per-user prototypes when FACE_MATCH_MODE=prototype (see prototypes.py).
+    With FACE_SNAPSHOT=true (default) the matrix starts as a read-only memmap
+    of the shared on-disk snapshot (see snapshot.py) and local enrolls copy
+    it on write; a background thread applies other workers' changes in place
+    and only swaps in a whole snapshot when this process is far behind.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        dim: int = 512,
+        index=None,
+        mode: str = MATCH_MODE,
+        snapshots: bool = SNAPSHOT_ENABLED,
+    ):
+        self.dim = dim
+        self.index = index if index is not None else make_index()
+        self.mode = mode
+        self.prototypes = PrototypeSet(dim) if mode == "prototype" else None
+        self.matrix = np.empty((0, dim), dtype=np.float32)
+        self.face_ids = np.empty(0, dtype=object)
+        self.user_ids = np.empty(0, dtype=object)
+        self.alive = np.empty(0, dtype=bool)
+        self.rows: dict[str, int] = {}  # face_id -> row
+        self.size = 0  # rows in use (alive + tombstoned)
+        self.generation = 0
+        self.loaded = False
+        self._write_lock = threading.RLock()
+        self.snapshots = snapshots
+        self.applied_version = -1  # every faces change up to this one is in memory
+        self._sync: SnapshotSync | None = None
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = Gallery()
+        inst = cls._instance
+        if not inst.loaded:
+            inst.load()
+        return inst
+
+    @classmethod
+    def loaded_instance(cls):
+        """The gallery if this process has already built it, else None."""
+        inst = cls._instance
+        return inst if inst is not None and inst.loaded else None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # --- building ---
+
+    def load(self) -> None:
+        """(Re)build the matrix from the snapshot, or else the faces table."""
+        if self.snapshots:
+            snap = ensure_snapshot()
+            with self._write_lock:
+                self._reset(snap.face_ids, snap.user_ids, snap.matrix)
+                self.applied_version = snap.version
+                self.loaded = True
+                if self._sync is None:
+                    self._sync = SnapshotSync(self)
+            return
+        version, fids, uids, matrix = load_matrix_versioned()
+        with self._write_lock:
+            self._reset(fids, uids, matrix)
+            self.applied_version = version
+            self.loaded = True
+
+    def adopt(self, snap: Snapshot) -> bool:
+        """
+        Switch to a newer snapshot generation (a full rebuild). Skipped when
+        the incremental updates already reflect its version.
+        """
+        with self._write_lock:
+            if snap.version <= self.applied_version:
+                return False
+            self._reset(snap.face_ids, snap.user_ids, snap.matrix)
+            self.applied_version = snap.version
+            return True
+
+    def remap(self, snap: Snapshot) -> bool:
+        """
+        Swap a private matrix for the mapped snapshot of the same version (one
+        this process just published), so the copy made on write is released.
+        """
+        with self._write_lock:
+            if snap.version != self.applied_version or not self.matrix.flags.writeable:
+                return False
+            self._reset(snap.face_ids, snap.user_ids, snap.matrix)
+            return True
+
+    def apply_changes(self, fetch) -> int:
+        """
+        Apply other processes' writes in place: `fetch(since)` returns
+        (current_version, [(rev, face_id, user_id, vector or None), ...]) as
+        db.changes_since does. Read and applied under the write lock, so a
+        local write racing with it lands after it. Returns the changes applied.
+        """
+        with self._write_lock:
+            current, changes = fetch(self.applied_version)
+            upserts = [(fid, uid, v) for _, fid, uid, v in changes if v is not None]
+            deletes = [fid for _, fid, _, v in changes if v is None]
+            if upserts:
+                self._add_locked(upserts)
+            if deletes:
+                self._remove_locked(deletes)
+                self._maybe_compact()
+            if changes:
+                self.generation += 1
+            # the last logged rev is current unless fetch stopped at its limit
+            self.applied_version = changes[-1][0] if changes else current
+            return len(changes)
+
+    def export_rows(self):
+        """
+        (version, face_ids, user_ids, matrix copy) of the live rows, or None
+        when memory is not exactly the faces table at applied_version.
+        """
+        with self._write_lock:
+            if faces_version() != self.applied_version:
+                return None
+            keep = np.flatnonzero(self.alive[: self.size])
+            return (
+                self.applied_version,
+                list(self.face_ids[keep]),
+                list(self.user_ids[keep]),
+                self.matrix[keep],
+            )
+
+    def _reset(self, fids: list, uids: list, matrix: np.ndarray) -> None:
+        face_ids = np.empty(len(fids), dtype=object)
+        face_ids[:] = fids
+        user_ids = np.empty(len(uids), dtype=object)
+        user_ids[:] = uids
+        self._install(matrix, face_ids, user_ids, len(fids))
+        self.index.reset(matrix, face_ids)
+        if self.prototypes is not None:
+            self.prototypes.reset(zip(fids, uids, matrix))
+
+    def _install(self, matrix, face_ids, user_ids, size: int) -> None:
+        alive = np.ones(matrix.shape[0], dtype=bool)
+        alive[size:] = False
+        self.matrix, self.face_ids, self.user_ids = matrix, face_ids, user_ids
+        self.alive = alive
+        self.size = size
+        self.rows = {face_ids[i]: i for i in range(size)}
+        self.generation += 1
+
+    def _grow(self, needed: int) -> None:
+        cap = self.matrix.shape[0]
+        if needed <= cap and self.matrix.flags.writeable:
+            return  # a mapped snapshot is read-only: copy it on first write
+        new_cap = max(needed, cap * 2, 64)
+        matrix = np.empty((new_cap, self.dim), dtype=np.float32)
+        matrix[: self.size] = self.matrix[: self.size]
+        face_ids = np.empty(new_cap, dtype=object)
+        face_ids[: self.size] = self.face_ids[: self.size]
+        user_ids = np.empty(new_cap, dtype=object)
+        user_ids[: self.size] = self.user_ids[: self.size]
+        alive = np.zeros(new_cap, dtype=bool)
+        alive[: self.size] = self.alive[: self.size]
+        self.matrix, self.face_ids, self.user_ids = matrix, face_ids, user_ids
+        self.alive = alive
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self.alive[: self.size])
+        self._install(
+            np.ascontiguousarray(self.matrix[keep]),
+            self.face_ids[keep],
+            self.user_ids[keep],
+            len(keep),
+        )
+        self.index.compact(keep)
+
+    # --- incremental updates ---
+
+    def add(
+        self, face_id: str, user_id: str, embedding: np.ndarray, version: int = 0
+    ) -> int:
+        return self.add_many([(face_id, user_id, embedding)], version)
+
+    def add_many(
+        self, items: list[tuple[str, str, np.ndarray]], version: int = 0
+    ) -> int:
+        """
+        Append rows in place (replacing any existing row with the same face_id).
+        `version` is the faces_version after the matching DB write.
+        """
+        with self._write_lock:
+            self._wrote(version, len(items))
+            self._add_locked(items)
+            self.generation += 1
+            return self.generation
+
+    def _add_locked(self, items: list[tuple[str, str, np.ndarray]]) -> None:
+        self._remove_locked([fid for fid, _, _ in items if fid in self.rows])
+        self._grow(self.size + len(items))
+        start = self.size
+        for fid, uid, emb in items:
+            i = self.size
+            self.matrix[i] = np.asarray(emb, dtype=np.float32).reshape(-1)
+            self.face_ids[i] = fid
+            self.user_ids[i] = uid
+            self.alive[i] = True
+            self.rows[fid] = i
+            self.size += 1
+            if self.prototypes is not None:
+                self.prototypes.add(fid, uid, emb)
+        self.index.append(start, self.matrix[: self.size], self.face_ids[: self.size])
+
+    def remove(self, face_ids: list[str], version: int = 0) -> int:
+        """Tombstone rows; compacts when the dead share gets large."""
+        with self._write_lock:
+            removed = self._remove_locked(face_ids)
+            self._wrote(version, removed)
+            if removed:
+                self._maybe_compact()
+                self.generation += 1
+            return self.generation
+
+    def _maybe_compact(self) -> None:
+        dead = self.size - len(self.rows)
+        if dead >= COMPACT_MIN and dead >= COMPACT_RATIO * self.size:
+            self._compact()
+
+    def _wrote(self, version: int, changed: int) -> None:
+        # one faces_version step per changed row (row triggers): if nothing
+        # else was written in between, memory now reflects `version`; if
+        # something was, the sync thread's catch-up fills the gap
+        if version and version - changed == self.applied_version:
+            self.applied_version = version
+        if self._sync is not None:
+            self._sync.mark_dirty()  # publish a new snapshot for the other workers
+
+    def _remove_locked(self, face_ids: list[str]) -> int:
+        removed = 0
+        for fid in face_ids:
+            i = self.rows.pop(fid, None)
+            if i is not None:
+                self.alive[i] = False
+                removed += 1
+                if self.prototypes is not None:
+                    self.prototypes.remove(fid, self.user_ids[i])
+        return removed
+
+    # --- search ---
+
+    def search(self, queries: np.ndarray, k: int) -> list[list[tuple[str, str, float]]]:
+        """
+        Top-k cosine matches for each query row (embeddings are L2-normalized,
+        so the dot product is the cosine similarity).
+        Returns one list of (face_id, user_id, similarity) per query, best first.
+        In prototype mode the list holds distinct users (per-user decision).
+        """
+        q = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.prototypes is not None:
+            with self._write_lock:
+                state = self.prototypes.prepare()
+            return PrototypeSet.search(state, q, k)
+
+        with self._write_lock:
+            n = self.size
+            matrix = self.matrix[:n]
+            face_ids, user_ids = self.face_ids, self.user_ids
+            alive = self.alive[:n].copy()
+            n_alive = len(self.rows)
+            state = self.index.prepare()
+        if n_alive == 0:
+            return [[] for _ in range(q.shape[0])]
+
+        hits = self.index.search(state, q, matrix, alive, k)
+        return [
+            [(face_ids[j], user_ids[j], float(s)) for j, s in zip(row_idx, row_sims)]
+            for row_idx, row_sims in hits
+        ]
+
+
+def current_generation() -> int | None:
+    """Generation of this process's gallery (None until it has been built)."""
+    g = Gallery.loaded_instance()
+    return g.generation if g is not None else None
@@ -0,0 +1,315 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+
+from .db import FACES_DIR
+
+FACE_IO_WORKERS = int(os.getenv("FACE_IO_WORKERS", "4"))  # image writes + DB
+THUMB_SIZE = int(os.getenv("FACE_THUMB_SIZE", "160"))  # longest side, pixels
+THUMB_MARGIN = float(os.getenv("FACE_THUMB_MARGIN", "0.25"))  # of box size, per side
+THUMB_QUALITY = int(os.getenv("FACE_THUMB_QUALITY", "85"))
+KEEP_ORIGINALS = os.getenv("FACE_KEEP_ORIGINALS", "false").lower() == "true"
+# both live beside FACES_DIR, not in it: FACES_DIR is served at /static/faces
+# and its folders are user ids. Blobs must share FACES_DIR's filesystem
+# (faces are hard links to them).
+BLOB_DIR = Path(os.getenv("FACE_BLOB_DIR", str(FACES_DIR.parent / "face_blobs")))
+# list-view variants served by GET /api/faces/{face_id}/thumb (longest side, px)
+THUMB_SIZES = {"s": 48, "m": 96, "l": 160}
+THUMB_CACHE_DIR = Path(
+    os.getenv("FACE_THUMB_CACHE_DIR", str(FACES_DIR.parent / "face_thumbs"))
+)
+THUMB_CACHE_MB = float(os.getenv("FACE_THUMB_CACHE_MB", "64"))
+THUMB_MAX_AGE = int(os.getenv("FACE_THUMB_MAX_AGE", "86400"))  # Cache-Control, s
+
+_io_pool: ThreadPoolExecutor | None = None
+_io_lock = threading.Lock()
+
+
+def io_pool() -> ThreadPoolExecutor:
+    """Shared thread pool for blocking file/DB work kept off the event loop."""
+    global _io_pool
+    if _io_pool is None:
+        with _io_lock:
+            if _io_pool is None:
+                _io_pool = ThreadPoolExecutor(
+                    FACE_IO_WORKERS, thread_name_prefix="face-io"
+                )
+    return _io_pool
+
+
+def face_crop(bgr: np.ndarray, bbox, size: int = THUMB_SIZE) -> np.ndarray:
+    """Face box plus THUMB_MARGIN, downscaled so its longest side is <= size."""
+    import cv2
+
+    h, w = bgr.shape[:2]
+    x1, y1, x2, y2 = bbox
+    mx, my = (x2 - x1) * THUMB_MARGIN, (y2 - y1) * THUMB_MARGIN
+    x1, y1 = max(0, int(x1 - mx)), max(0, int(y1 - my))
+    x2, y2 = min(w, int(x2 + mx)), min(h, int(y2 + my))
+    crop = bgr[y1:y2, x1:x2]
+    if crop.size == 0:
+        crop = bgr
+    scale = size / max(crop.shape[:2])
+    if scale < 1.0:
+        crop = cv2.resize(
+            crop,
+            (
+                max(1, round(crop.shape[1] * scale)),
+                max(1, round(crop.shape[0] * scale)),
+            ),
+            interpolation=cv2.INTER_AREA,
+        )
+    return np.ascontiguousarray(crop)
+
+
+class ImageStore:
+    """
+    Enrollment images under FACES_DIR. Each face gets a small JPEG thumbnail
+    of its crop at <user_id>/<face_id>.jpg (the /static/faces URL), plus the
+    uploaded photo at <user_id>/originals/<face_id>.jpg with
+    FACE_KEEP_ORIGINALS=true. Files are content-addressed: bytes live once
+    in BLOB_DIR/<sha1> and per-face paths are hard links to them, so
+    duplicate uploads cost no extra disk (where the filesystem has no hard
+    links, faces get plain copies and no blob is kept). Encoding and writing
+    run on the I/O pool via save_async(), before the face row is committed.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        root: Path = FACES_DIR,
+        keep_originals: bool = KEEP_ORIGINALS,
+        blob_dir: Path = BLOB_DIR,
+    ):
+        self.root = Path(root)
+        self.blob_dir = Path(blob_dir)
+        self.keep_originals = keep_originals
+        _move_legacy(self.root / "_blobs", self.blob_dir)
+        self.written = 0
+        self.deduped = 0
+        self.bytes_written = 0
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = ImageStore()
+        return cls._instance
+
+    async def save_async(
+        self, img_path: str, crop: np.ndarray, raw: bytes | None = None
+    ) -> None:
+        """save() on the I/O pool, off the event loop; raises what save() raises."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(io_pool(), self.save, img_path, crop, raw)
+
+    def save(self, img_path: str, crop: np.ndarray, raw: bytes | None = None) -> None:
+        import cv2
+
+        ok, enc = cv2.imencode(
+            ".jpg", crop, [int(cv2.IMWRITE_JPEG_QUALITY), THUMB_QUALITY]
+        )
+        if not ok:
+            raise ValueError(f"could not encode thumbnail for {img_path}")
+        dest = Path(img_path)
+        self._put(enc.tobytes(), dest)
+        if self.keep_originals and raw:
+            if raw[:3] != b"\xff\xd8\xff":  # store originals as JPEG too
+                bgr = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+                raw = cv2.imencode(".jpg", bgr)[1].tobytes() if bgr is not None else b""
+            if raw:
+                self._put(raw, dest.parent / "originals" / dest.name)
+
+    def _blob(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / f"{digest}.jpg"
+
+    def _put(self, data: bytes, dest: Path) -> None:
+        blob = self._blob(hashlib.sha1(data).hexdigest())
+        created = not blob.exists()
+        if not created:
+            self.deduped += 1
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp = blob.with_name(f".{blob.name}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, blob)
+            self.written += 1
+            self.bytes_written += len(data)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.unlink(missing_ok=True)
+        try:
+            os.link(blob, dest)
+        except OSError:  # no hard links here: plain copy
+            dest.write_bytes(data)
+            if created:  # release() can't count copies: don't keep a blob
+                blob.unlink(missing_ok=True)
+
+    def release(self, path: Path) -> None:
+        """Remove a face's file, and its blob once no other face links to it."""
+        path = Path(path)
+        for p in (path, path.parent / "originals" / path.name):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            if st.st_nlink == 2:  # this path + its blob: the blob becomes orphaned
+                blob = self._blob(hashlib.sha1(p.read_bytes()).hexdigest())
+                if blob.exists() and blob.stat().st_ino == st.st_ino:
+                    blob.unlink(missing_ok=True)
+            p.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {
+            "written": self.written,
+            "deduped": self.deduped,
+            "bytes_written": self.bytes_written,
+        }
+
+
+class ThumbnailCache:
+    """
+    Size variants (THUMB_SIZES) of stored face images, rendered on first
+    request into THUMB_CACHE_DIR/<variant>/<etag>.jpg and evicted least
+    recently used once they exceed FACE_THUMB_CACHE_MB. The etag is derived
+    from the source file's inode, size and mtime: images are content-addressed
+    blobs that are never rewritten in place, so it pins the exact bytes and
+    a changed source simply renders under a new name. Each worker keeps its
+    own LRU order (seeded from file mtimes); a file evicted by another worker
+    is re-rendered on its next miss.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        root: Path = THUMB_CACHE_DIR,
+        max_bytes: int = int(THUMB_CACHE_MB * 1024 * 1024),
+    ):
+        self.root = Path(root)
+        _move_legacy(FACES_DIR / "_thumbs", self.root)
+        self.max_bytes = max_bytes
+        self._lru: OrderedDict[Path, int] = OrderedDict()  # path -> size, oldest first
+        self._bytes = 0
+        self._mu = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scan()
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = ThumbnailCache()
+        return cls._instance
+
+    def _scan(self) -> None:
+        found = []
+        for p in self.root.glob("*/*.jpg"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            found.append((st.st_mtime, p, st.st_size))
+        for _, p, size in sorted(found):
+            self._lru[p] = size
+            self._bytes += size
+
+    @staticmethod
+    def etag(src: Path, variant: str) -> str:
+        """Strong validator for `variant` of src; raises OSError if src is gone."""
+        st = Path(src).stat()
+        key = f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}-{variant}"
+        return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+    def thumbnail(self, src: Path, variant: str, tag: str | None = None) -> bytes:
+        """JPEG bytes of `variant` of src, from the cache or rendered on a miss."""
+        tag = tag or self.etag(src, variant)
+        path = self.root / variant / f"{tag}.jpg"
+        try:
+            data = path.read_bytes()
+        except OSError:
+            data = None
+        if data is not None:
+            self.hits += 1
+            self._touch(path, len(data))
+            return data
+        self.misses += 1
+        data = _render(Path(src), THUMB_SIZES[variant])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._touch(path, len(data))
+        return data
+
+    def _touch(self, path: Path, size: int) -> None:
+        evict = []
+        with self._mu:
+            if path in self._lru:
+                self._lru.move_to_end(path)
+            else:
+                self._lru[path] = size
+                self._bytes += size
+            while self._bytes > self.max_bytes and len(self._lru) > 1:
+                old, old_size = self._lru.popitem(last=False)
+                self._bytes -= old_size
+                evict.append(old)
+        for old in evict:
+            old.unlink(missing_ok=True)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._lru),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def _move_legacy(old: Path, new: Path) -> None:
+    """Older layouts kept blobs / thumbnails inside FACES_DIR: move them out."""
+    if old.is_dir() and not new.exists():
+        new.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(old, new)
+        except OSError as e:
+            print(f"[images] could not move {old} to {new}: {e}")
+
+
+def _render(src: Path, size: int) -> bytes:
+    """
+    `src` downscaled to `size`, straight from the stored blob's bytes; a blob
+    already that small is returned as it is rather than re-encoded.
+    """
+    import cv2
+
+    raw = Path(src).read_bytes()
+    bgr = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError(f"unreadable image: {src}")
+    scale = size / max(bgr.shape[:2])
+    if scale >= 1.0:
+        return raw
+    bgr = cv2.resize(
+        bgr,
+        (max(1, round(bgr.shape[1] * scale)), max(1, round(bgr.shape[0] * scale))),
+        interpolation=cv2.INTER_AREA,
+    )
+    ok, enc = cv2.imencode(".jpg", bgr, [int(cv2.IMWRITE_JPEG_QUALITY), THUMB_QUALITY])
+    if not ok:
+        raise ValueError(f"could not encode thumbnail for {src}")
+    return enc.tobytes()
@@ -0,0 +1,361 @@
+import os
+import tempfile
+from pathlib import Path
+import numpy as np
+
+from .db import DB_PATH
+
+INDEX_KIND = os.getenv("FACE_INDEX", "flat").lower()  # flat | ivf | int8
+IVF_NLIST = int(os.getenv("FACE_IVF_NLIST", "0"))  # 0 = auto (~sqrt(N))
+IVF_NPROBE = int(os.getenv("FACE_IVF_NPROBE", "32"))
+# below this: exact scan. Per query on one core (`bench index`, nprobe=32):
+# 20k faces 1.5 ms flat vs 1.4 ms IVF, 100k faces 17.9 ms vs 4.6 ms. The flat
+# scan stays in cache up to a few 10k rows, so IVF pays off from about 50k.
+IVF_MIN_ROWS = int(os.getenv("FACE_IVF_MIN_ROWS", "50000"))
+IVF_PATH = Path(os.getenv("FACE_IVF_PATH", str(Path(DB_PATH).with_suffix(".ivf.npz"))))
+# int8 index: re-score this many candidates in float32 (0 = no re-rank)
+QUANT_RERANK = int(os.getenv("FACE_QUANT_RERANK", "32"))
+QUANT_CHUNK = 256  # rows widened to float32 per matmul (stays in L2)
+
+
+def topk(sims: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Column indices + values of the k largest entries per row, best first."""
+    n = sims.shape[1]
+    k = max(1, min(k, n))
+    if k < n:
+        idx = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(n), sims.shape)
+    part = np.take_along_axis(sims, idx, axis=1)
+    order = np.argsort(-part, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(
+        part, order, axis=1
+    )
+
+
+def _flat_search(q, matrix, alive, k) -> list[tuple[np.ndarray, np.ndarray]]:
+    sims = q @ matrix.T  # (num_queries, n)
+    if not alive.all():
+        sims[:, ~alive] = -np.inf
+    k = min(k, int(alive.sum()))
+    idx, vals = topk(sims, k)
+    return list(zip(idx, vals))
+
+
+class FlatIndex:
+    """Exact search: one matmul over the whole gallery."""
+
+    kind = "flat"
+
+    def reset(self, matrix: np.ndarray, face_ids: np.ndarray) -> None:
+        pass
+
+    def append(self, start: int, matrix: np.ndarray, face_ids: np.ndarray) -> None:
+        """matrix / face_ids are the gallery's rows in use; new ones from `start`."""
+        pass
+
+    def compact(self, keep: np.ndarray) -> None:
+        pass
+
+    def prepare(self):
+        return None
+
+    def search(self, state, q, matrix, alive, k):
+        """One (row_indices, similarities) pair per query, best first."""
+        return _flat_search(q, matrix, alive, k)
+
+
+class IVFIndex:
+    """
+    Inverted-file index: rows are bucketed under k-means centroids and a query
+    only scans the `nprobe` closest buckets. Centroids and row assignments are
+    persisted to IVF_PATH so a restart reuses them instead of re-training.
+    A gallery below `min_rows` is scanned exactly and trained once it grows
+    past it (and re-trained once it has quadrupled). A query whose probed
+    buckets hold fewer than k live rows (mostly tombstones) falls back to
+    the exact scan.
+    """
+
+    kind = "ivf"
+
+    def __init__(
+        self,
+        path: Path = IVF_PATH,
+        nlist: int = IVF_NLIST,
+        nprobe: int = IVF_NPROBE,
+        min_rows: int = IVF_MIN_ROWS,
+    ):
+        self.path = Path(path)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+        self.centroids: np.ndarray | None = None
+        self.assign = np.empty(0, dtype=np.int32)  # row -> bucket
+        self.trained_on = 0
+
+    # --- building ---
+
+    def reset(self, matrix: np.ndarray, face_ids: np.ndarray) -> None:
+        n = matrix.shape[0]
+        if self._load(matrix, face_ids):
+            return
+        if n < self.min_rows:
+            self.centroids, self.assign, self.trained_on = (
+                None,
+                np.empty(0, np.int32),
+                0,
+            )
+            return
+        self.train(matrix)
+        self.save(face_ids[:n])
+
+    def train(self, matrix: np.ndarray, iters: int = 10, seed: int = 0) -> None:
+        n = matrix.shape[0]
+        nlist = self.nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(n, size=min(n, 64 * nlist), replace=False)]
+        centroids = sample[
+            rng.choice(sample.shape[0], size=nlist, replace=False)
+        ].copy()
+        for _ in range(iters):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = (sums / np.maximum(norms, 1e-12)).astype(np.float32)
+        self.centroids = centroids
+        self.assign = self._assign(matrix)
+        self.trained_on = n
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        out = np.empty(vectors.shape[0], dtype=np.int32)
+        for s in range(0, vectors.shape[0], 8192):
+            out[s : s + 8192] = np.argmax(
+                vectors[s : s + 8192] @ self.centroids.T, axis=1
+            )
+        return out
+
+    # --- persistence ---
+
+    def save(self, face_ids: np.ndarray) -> None:
+        if self.centroids is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # a unique temp name: several workers may save at once
+        with tempfile.NamedTemporaryFile(
+            dir=self.path.parent, prefix=f".{self.path.name}.", delete=False
+        ) as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                assign=self.assign[: len(face_ids)],
+                face_ids=np.asarray(face_ids, dtype=str),
+                trained_on=np.int64(self.trained_on),
+            )
+        try:
+            os.replace(f.name, self.path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+
+    def _load(self, matrix: np.ndarray, face_ids: np.ndarray) -> bool:
+        n = matrix.shape[0]
+        if not self.path.exists():
+            return False
+        try:
+            with np.load(self.path, allow_pickle=False) as z:
+                centroids = z["centroids"]
+                saved_ids = z["face_ids"]
+                saved_assign = z["assign"]
+                trained_on = int(z["trained_on"])
+        except Exception:
+            return False
+        # stale after the gallery quadrupled (or shrank a lot): re-train
+        if (
+            centroids.shape[1] != matrix.shape[1]
+            or n < self.min_rows
+            or n > 4 * trained_on
+        ):
+            return False
+
+        self.centroids = centroids.astype(np.float32)
+        self.trained_on = trained_on
+        known = dict(zip(saved_ids.tolist(), saved_assign.tolist()))
+        assign = np.full(n, -1, dtype=np.int32)
+        for i in range(n):
+            assign[i] = known.get(face_ids[i], -1)
+        missing = np.flatnonzero(assign < 0)
+        if len(missing):
+            assign[missing] = self._assign(matrix[missing])
+        self.assign = assign
+        if len(missing) > n // 10:
+            self.save(face_ids[:n])
+        return True
+
+    # --- incremental updates ---
+
+    def append(self, start: int, matrix: np.ndarray, face_ids: np.ndarray) -> None:
+        end = matrix.shape[0]
+        if end >= self.min_rows and (
+            self.centroids is None or end > 4 * self.trained_on
+        ):
+            self.train(matrix)
+            self.save(face_ids[:end])
+            return
+        if self.centroids is None:
+            return
+        vectors = matrix[start:end]
+        if end > self.assign.shape[0]:
+            grown = np.full(max(end, 2 * self.assign.shape[0]), -1, dtype=np.int32)
+            grown[: self.assign.shape[0]] = self.assign
+            self.assign = grown
+        self.assign[start:end] = self._assign(vectors)
+
+    def compact(self, keep: np.ndarray) -> None:
+        if self.centroids is not None:
+            self.assign = self.assign[keep]
+
+    # --- search ---
+
+    def prepare(self):
+        """Per-query state (call under the gallery lock)."""
+        if self.centroids is None:
+            return None
+        # rows below the gallery's size are never reassigned in place
+        return (self.centroids, self.assign)
+
+    def search(self, state, q, matrix, alive, k):
+        if state is None:
+            return _flat_search(q, matrix, alive, k)
+        centroids, assign = state
+        n = matrix.shape[0]
+        want = min(k, int(alive.sum()))
+        # every query at once: scan the union of the batch's probed buckets
+        # with one matmul, then mask each query's rows outside its own buckets
+        probe, _ = topk(q @ centroids.T, self.nprobe)
+        probed = np.zeros((q.shape[0], centroids.shape[0]), dtype=bool)
+        np.put_along_axis(probed, probe, True, axis=1)
+        buckets = assign[:n]
+        cand = np.flatnonzero(probed.any(axis=0)[buckets] & alive)
+        mine = probed[:, buckets[cand]]  # (num_queries, len(cand))
+        sims = q @ matrix[cand].T
+        sims[~mine] = -np.inf
+        idx, vals = topk(sims, k) if cand.size else (None, None)
+        out = []
+        for i in range(q.shape[0]):
+            if int(mine[i].sum()) < want:  # probed buckets are mostly tombstones
+                out.extend(_flat_search(q[i : i + 1], matrix, alive, k))
+            else:
+                out.append((cand[idx[i, :want]], vals[i, :want]))
+        return out
+
+
+def quantize(vectors: np.ndarray):
+    """
+    (int8 codes, float32 scales) for float32 rows, with a per-row scale of
+    max |v| / 127 (same layout as the int8 DB blobs).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class QuantizedIndex:
+    """
+    Scan over int8 codes with a per-row scale (a quarter of the float32
+    size). The best `rerank` candidates are then re-scored against the
+    full-precision rows (only those rows are touched), which makes the
+    reported similarities - and the threshold decision - exact.
+
+    This trades latency for memory: numpy has no int8 matmul, so every scan
+    widens the codes to float32 a chunk at a time, which makes it slower than
+    the flat BLAS scan (~1.3x at 20k faces, see `bench quant`). It only saves memory while the gallery's float32
+    rows are the mapped snapshot (FACE_SNAPSHOT=true), whose pages the scan
+    never touches and the OS can drop. A private float32 matrix (a local
+    write copied the mapping, or snapshots are off) would sit next to the
+    codes, so the codes are released and the exact scan is used until the
+    gallery is mapped again (see Gallery.remap).
+    """
+
+    kind = "int8"
+    wants_mapped = True  # Gallery remaps onto each snapshot it publishes
+
+    def __init__(self, rerank: int = QUANT_RERANK):
+        self.rerank = rerank
+        self.codes: np.ndarray | None = None
+        self.scales: np.ndarray | None = None
+        self._warned = False
+
+    def reset(self, matrix: np.ndarray, face_ids: np.ndarray) -> None:
+        if not isinstance(matrix, np.memmap):
+            self._release()
+            return
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        scales = np.empty(matrix.shape[0], dtype=np.float32)
+        for s in range(0, matrix.shape[0], 8192):
+            codes[s : s + 8192], scales[s : s + 8192] = quantize(matrix[s : s + 8192])
+        self.codes, self.scales = codes, scales
+
+    def append(self, start: int, matrix: np.ndarray, face_ids: np.ndarray) -> None:
+        # the gallery copied the mapping to write these rows
+        self._release()
+
+    def compact(self, keep: np.ndarray) -> None:
+        self._release()  # compaction builds a private matrix
+
+    def _release(self) -> None:
+        if self.codes is not None or not self._warned:
+            print("[index] int8: gallery is not mapped, using the exact scan")
+            self._warned = True
+        self.codes = self.scales = None
+
+    def prepare(self):
+        if self.codes is None:
+            return None
+        return (self.codes, self.scales)
+
+    def nbytes(self, n: int) -> int:
+        """Resident size of the codes and scales for n rows."""
+        return 0 if self.codes is None else n * (self.codes.shape[1] + 4)
+
+    def scores(self, state, q: np.ndarray, n: int) -> np.ndarray:
+        """Approximate similarities (num_queries, n) from the codes alone."""
+        codes, scales = state
+        sims = np.empty((q.shape[0], n), dtype=np.float32)
+        for s in range(0, n, QUANT_CHUNK):
+            e = min(n, s + QUANT_CHUNK)
+            sims[:, s:e] = q @ codes[s:e].astype(np.float32).T
+        sims *= scales[:n]
+        return sims
+
+    def search(self, state, q, matrix, alive, k):
+        if state is None:
+            return _flat_search(q, matrix, alive, k)
+        n = matrix.shape[0]
+        sims = self.scores(state, q, n)
+        if not alive.all():
+            sims[:, ~alive] = -np.inf
+        n_alive = int(alive.sum())
+        k = min(k, n_alive)
+        if not self.rerank:
+            idx, vals = topk(sims, k)
+            return list(zip(idx, vals))
+
+        cand, _ = topk(sims, min(max(k, self.rerank), n_alive))
+        exact = np.einsum("qcd,qd->qc", matrix[cand], q)  # float32 re-score
+        idx, vals = topk(exact, k)
+        return list(zip(np.take_along_axis(cand, idx, axis=1), vals))
+
+
+def make_index(kind: str = INDEX_KIND):
+    if kind == "ivf":
+        return IVFIndex()
+    if kind == "int8":
+        return QuantizedIndex()
+    return FlatIndex()
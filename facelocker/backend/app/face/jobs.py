@@ -0,0 +1,173 @@
+import asyncio
+import os
+import time
+import uuid
+
+from .db import add_faces
+from .executor import InferenceExecutor, Saturated, enroll_job
+from .images import ImageStore, io_pool
+
+JOB_KEEP = int(os.getenv("FACE_JOB_KEEP", "100"))  # finished jobs kept for polling
+SATURATED_BACKOFF_S = 0.05
+
+
+class EnrollJob:
+    """
+    One background batch enrollment. Every image is embedded on the
+    inference pool (in parallel, up to one per worker), its thumbnail is
+    stored on the I/O pool (see images.py), and all faces are inserted in
+    a single transaction at the end. `snapshot()` is what the progress
+    endpoint returns.
+    """
+
+    def __init__(self, user_id: str, items: list[tuple[str, bytes, str]]):
+        self.job_id = f"J_{uuid.uuid4().hex[:12]}"
+        self.user_id = user_id
+        self.items = items  # (face_id, raw, img_path)
+        self.status = "queued"  # queued | running | done | failed
+        self.error: str | None = None
+        self.processed = 0
+        self.added = 0
+        self.results: list[dict | None] = [None] * len(items)
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.done = asyncio.Event()
+
+    async def run(self) -> None:
+        self.status = "running"
+        self.started_at = time.time()
+        loop = asyncio.get_running_loop()
+        executor = InferenceExecutor.get()
+        # one in flight per worker: keeps the pool busy without filling the
+        # queue that live /api/recognize traffic also needs
+        slots = asyncio.Semaphore(executor.workers)
+        rows: list[tuple | None] = [None] * len(self.items)
+        writes = []
+
+        async def one(idx: int, face_id: str, raw: bytes, img_path: str):
+            async with slots:
+                try:
+                    res = await _run_patiently(executor, enroll_job, raw)
+                except Exception as e:
+                    res = {"error": str(e)}
+            if "error" in res:
+                self.results[idx] = {
+                    "index": idx,
+                    "status": "error",
+                    "error": res["error"],
+                }
+            else:
+                writes.append(
+                    loop.run_in_executor(
+                        io_pool(), ImageStore.get().save, img_path, res["crop"], raw
+                    )
+                )
+                rows[idx] = (
+                    face_id,
+                    self.user_id,
+                    res["embedding"],
+                    img_path,
+                    res["quality"],
+                )
+                self.results[idx] = {
+                    "index": idx,
+                    "status": "ok",
+                    "face_id": face_id,
+                    "quality": res["quality"],
+                    "image_url": f"/static/faces/{self.user_id}/{face_id}.jpg",
+                }
+            self.processed += 1
+
+        try:
+            await asyncio.gather(*(one(i, *item) for i, item in enumerate(self.items)))
+            # let every write settle first, so release() below never races one
+            for res in await asyncio.gather(*writes, return_exceptions=True):
+                if isinstance(res, Exception):
+                    raise res
+            ok = [r for r in rows if r is not None]
+            self.added = await loop.run_in_executor(io_pool(), add_faces, ok)
+            self.status = "done"
+        except Exception as e:
+            self.status, self.error = "failed", str(e)
+            for idx, r in enumerate(rows):
+                if r is not None:
+                    ImageStore.get().release(r[3])
+                    self.results[idx] = {
+                        "index": idx,
+                        "status": "error",
+                        "error": f"not_stored: {e}",
+                    }
+        finally:
+            self.items = []  # drop the upload bytes
+            self.finished_at = time.time()
+            self.done.set()
+
+    def snapshot(self, results: bool = True) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        out = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "user_id": self.user_id,
+            "total": len(self.results),
+            "processed": self.processed,
+            "added": self.added,
+            "failed": sum(
+                1 for r in self.results if r is not None and r["status"] == "error"
+            ),
+            "elapsed_s": round(elapsed, 3),
+            "images_per_s": round(self.processed / elapsed, 2) if elapsed else None,
+        }
+        if self.error:
+            out["error"] = self.error
+        if results:
+            out["results"] = [r for r in self.results if r is not None]
+        return out
+
+
+async def _run_patiently(executor: InferenceExecutor, fn, *args):
+    # background work waits for room instead of surfacing a 503
+    while True:
+        try:
+            return await executor.run(fn, *args)
+        except Saturated:
+            await asyncio.sleep(SATURATED_BACKOFF_S)
+
+
+class EnrollJobs:
+    """
+    In-process registry of batch enrollment jobs (newest JOB_KEEP kept).
+    Jobs live in the worker that accepted them: with WEB_CONCURRENCY > 1,
+    poll through sticky sessions or use wait=true, since another worker
+    answers 404.
+    """
+
+    _instance = None
+
+    def __init__(self, keep: int = JOB_KEEP):
+        self.keep = keep
+        self.jobs: dict[str, EnrollJob] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = EnrollJobs()
+        return cls._instance
+
+    def start(self, job: EnrollJob) -> EnrollJob:
+        self.jobs[job.job_id] = job
+        task = asyncio.ensure_future(job.run())
+        self._tasks.add(task)  # keep a reference until it finishes
+        task.add_done_callback(self._tasks.discard)
+        self._prune()
+        return job
+
+    def find(self, job_id: str) -> EnrollJob | None:
+        return self.jobs.get(job_id)
+
+    def _prune(self) -> None:
+        finished = [j for j in self.jobs.values() if j.finished_at is not None]
+        for job in finished[: max(0, len(finished) - self.keep)]:
+            del self.jobs[job.job_id]
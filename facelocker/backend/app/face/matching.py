@@ -0,0 +1,53 @@
+import os
+import numpy as np
+
+from .gallery import Gallery
+
+THRESHOLD = float(os.getenv("FACE_COS_THRESHOLD", 0.75))  # cosine similarity
+TOPK = 5
+
+
+def match_response(embeddings, bboxes=None) -> dict:
+    """
+    Search the gallery for each query embedding and build the recognize
+    response: one {"bbox", "top", "best"} entry per query.
+    Free of OpenCV/InsightFace so search-only nodes can use it.
+    """
+    gallery = Gallery.get()
+    if len(gallery) == 0:
+        return {
+            "faces": [],
+            "error": "gallery_empty",
+            "gallery_generation": gallery.generation,
+        }
+
+    # one matmul for all query faces against the whole gallery
+    matches = gallery.search(np.asarray(embeddings, dtype=np.float32), TOPK)
+    if bboxes is None:
+        bboxes = [None] * len(matches)
+
+    results = []
+    for bbox, top in zip(bboxes, matches):
+        best = top[0] if top else None  # empty if the index found no live rows
+        match = None
+        if best is not None and best[2] >= THRESHOLD:
+            match = {
+                "user_id": best[1],
+                "face_id": best[0],
+                "similarity": round(float(best[2]), 4),
+            }
+        results.append(
+            {
+                "bbox": [float(v) for v in bbox] if bbox is not None else None,
+                "top": [
+                    {"face_id": fid, "user_id": uid, "similarity": round(float(s), 4)}
+                    for fid, uid, s in top
+                ],
+                "best": match,
+            }
+        )
+    return {
+        "faces": results,
+        "match_mode": gallery.mode,
+        "gallery_generation": gallery.generation,
+    }
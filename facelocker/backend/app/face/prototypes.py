@@ -0,0 +1,111 @@
+import os
+import numpy as np
+
+from .index import topk
+
+MATCH_MODE = os.getenv("FACE_MATCH_MODE", "face").lower()  # face | prototype
+PROTO_EXEMPLARS = int(os.getenv("FACE_PROTO_EXEMPLARS", "3"))
+
+
+class PrototypeSet:
+    """
+    Per-user prototypes: the normalized mean of a user's embeddings plus up to
+    `exemplars` diverse photos (greedy farthest-point picks). A query is scored
+    against every prototype and a user's score is their best prototype, so
+    search cost scales with users instead of enrolled photos.
+    """
+
+    def __init__(self, dim: int = 512, exemplars: int = PROTO_EXEMPLARS):
+        self.dim = dim
+        self.exemplars = exemplars
+        self.faces: dict[str, dict[str, np.ndarray]] = {}  # user_id -> face_id -> emb
+        # user_id -> (prototype rows, exemplar face_ids)
+        self.protos: dict[str, tuple[np.ndarray, list[str]]] = {}
+        self._state = None  # cached stacked matrix, rebuilt lazily after changes
+
+    def __len__(self) -> int:
+        return len(self.protos)
+
+    def reset(self, items) -> None:
+        self.faces = {}
+        for fid, uid, emb in items:
+            self.faces.setdefault(uid, {})[fid] = np.asarray(emb, dtype=np.float32)
+        self.protos = {uid: self._build(f) for uid, f in self.faces.items()}
+        self._state = None
+
+    def add(self, face_id: str, user_id: str, embedding: np.ndarray) -> None:
+        faces = self.faces.setdefault(user_id, {})
+        faces[face_id] = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        self.protos[user_id] = self._build(faces)
+        self._state = None
+
+    def remove(self, face_id: str, user_id: str) -> None:
+        faces = self.faces.get(user_id)
+        if not faces or faces.pop(face_id, None) is None:
+            return
+        if faces:
+            self.protos[user_id] = self._build(faces)
+        else:
+            del self.faces[user_id]
+            del self.protos[user_id]
+        self._state = None
+
+    def _build(self, faces: dict[str, np.ndarray]) -> tuple[np.ndarray, list[str]]:
+        """Rows: [exemplar_1 .. exemplar_m, mean]; face_ids align with exemplars."""
+        ids = list(faces)
+        vecs = np.stack([faces[f] for f in ids])
+        mean = vecs.mean(axis=0)
+        mean /= max(float(np.linalg.norm(mean)), 1e-12)
+
+        # most typical photo first, then whichever is least similar to those picked
+        picked = [int(np.argmax(vecs @ mean))]
+        closest = vecs @ vecs[picked[0]]
+        while len(picked) < min(self.exemplars, len(ids)):
+            nxt = int(np.argmin(closest))
+            picked.append(nxt)
+            closest = np.maximum(closest, vecs @ vecs[nxt])
+
+        rows = np.vstack([vecs[picked], mean[None, :]]).astype(np.float32)
+        return rows, [ids[i] for i in picked]
+
+    def prepare(self):
+        """Immutable stacked view for search (call under the gallery lock)."""
+        if self._state is None:
+            users = list(self.protos)
+            if not users:
+                self._state = (
+                    np.empty((0, self.dim), np.float32),
+                    [],
+                    [],
+                    np.empty(0, np.int64),
+                )
+            else:
+                blocks = [self.protos[u][0] for u in users]
+                starts = np.cumsum([0] + [b.shape[0] for b in blocks[:-1]])
+                self._state = (
+                    np.vstack(blocks),
+                    users,
+                    [self.protos[u][1] for u in users],
+                    starts,
+                )
+        return self._state
+
+    @staticmethod
+    def search(state, q: np.ndarray, k: int) -> list[list[tuple[str, str, float]]]:
+        """Top-k users per query as (face_id, user_id, similarity), best first."""
+        matrix, users, face_ids, starts = state
+        if not users:
+            return [[] for _ in range(q.shape[0])]
+        sims = q @ matrix.T
+        per_user = np.maximum.reduceat(sims, starts, axis=1)  # (num_queries, users)
+        idx, vals = topk(per_user, k)
+        out = []
+        for qi, (row_idx, row_vals) in enumerate(zip(idx, vals)):
+            hits = []
+            for u, s in zip(row_idx, row_vals):
+                # report the closest exemplar photo (the mean has no face_id)
+                n_ex = len(face_ids[u])
+                ex = int(np.argmax(sims[qi, starts[u] : starts[u] + n_ex]))
+                hits.append((face_ids[u][ex], users[u], float(s)))
+            out.append(hits)
+        return out
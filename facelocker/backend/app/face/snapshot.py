@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not POSIX (Windows dev boxes): one process only
+    fcntl = None
+
+from .db import DB_PATH, changes_since, faces_version, load_matrix_versioned
+
+SNAPSHOT_ENABLED = os.getenv("FACE_SNAPSHOT", "true").lower() == "true"
+SNAPSHOT_DIR = Path(
+    os.getenv("FACE_SNAPSHOT_DIR", str(Path(DB_PATH).with_suffix(".gallery")))
+)
+SNAPSHOT_POLL_S = float(os.getenv("FACE_SNAPSHOT_POLL_S", "1.0"))
+# a process that changed faces publishes a new generation at most this often
+SNAPSHOT_INTERVAL_S = float(os.getenv("FACE_SNAPSHOT_INTERVAL_S", "30"))
+# changes a poll applies from face_changes; a bigger backlog adopts the snapshot
+SNAPSHOT_CATCHUP_MAX = int(os.getenv("FACE_SNAPSHOT_CATCHUP_MAX", "1000"))
+SNAPSHOT_KEEP = 3  # older generations are unlinked (mapped pages stay valid)
+
+
+class Snapshot:
+    """
+    One gallery snapshot generation, keyed by the faces_version it was built
+    from. On disk, under SNAPSHOT_DIR:
+      gallery-<version>.npy       float32 (N, dim), opened with mmap_mode="r"
+      gallery-<version>.ids.json  {"face_ids": [...], "user_ids": [...]}
+      current.json                {"version", "rows", "dim"}; the live generation
+    Every file is written to a temp name and os.replace()d, and current.json
+    is replaced last, so readers only ever see complete generations. Every
+    worker process maps the same file, so the pages are shared via the OS
+    page cache instead of each worker holding its own copy.
+    """
+
+    def __init__(self, version: int, face_ids: list, user_ids: list, matrix):
+        self.version = version
+        self.face_ids = face_ids
+        self.user_ids = user_ids
+        self.matrix = matrix
+
+    # --- reading ---
+
+    @staticmethod
+    def current_version(root: Path = SNAPSHOT_DIR) -> int | None:
+        try:
+            with open(root / "current.json") as f:
+                return int(json.load(f)["version"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @classmethod
+    def open(cls, version: int, root: Path = SNAPSHOT_DIR) -> "Snapshot":
+        matrix = np.load(root / f"gallery-{version}.npy", mmap_mode="r")
+        with open(root / f"gallery-{version}.ids.json") as f:
+            ids = json.load(f)
+        if len(ids["face_ids"]) != matrix.shape[0]:
+            raise ValueError(f"snapshot {version}: id table does not match matrix")
+        return cls(version, ids["face_ids"], ids["user_ids"], matrix)
+
+    @classmethod
+    def latest(cls, root: Path = SNAPSHOT_DIR) -> "Snapshot | None":
+        version = cls.current_version(root)
+        if version is None:
+            return None
+        try:
+            return cls.open(version, root)
+        except (OSError, ValueError, KeyError):
+            return None  # unlinked by a newer writer; the next poll catches up
+
+    # --- writing ---
+
+    @staticmethod
+    def write(version, face_ids, user_ids, matrix, root: Path = SNAPSHOT_DIR):
+        root.mkdir(parents=True, exist_ok=True)
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        _replace(root / f"gallery-{version}.npy", lambda f: np.save(f, matrix))
+        ids = {"face_ids": list(face_ids), "user_ids": list(user_ids)}
+        _replace(
+            root / f"gallery-{version}.ids.json",
+            lambda f: f.write(json.dumps(ids).encode()),
+        )
+        head = {"version": version, "rows": matrix.shape[0], "dim": matrix.shape[1]}
+        _replace(root / "current.json", lambda f: f.write(json.dumps(head).encode()))
+        _prune(root, version)
+
+
+def _replace(path: Path, write) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _prune(root: Path, live: int) -> None:
+    versions = sorted(
+        int(p.name.split("-", 1)[1].split(".", 1)[0])
+        for p in root.glob("gallery-*.npy")
+    )
+    for v in versions:
+        if v < live and v not in versions[-SNAPSHOT_KEEP:]:
+            for suffix in (".npy", ".ids.json"):
+                (root / f"gallery-{v}{suffix}").unlink(missing_ok=True)
+
+
+_local_lock = threading.Lock()
+
+
+@contextmanager
+def _writer_lock(root: Path):
+    """Cross-process lock, so concurrent workers build a generation only once."""
+    root.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        with _local_lock:
+            yield
+        return
+    with open(root / ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def ensure_snapshot(root: Path = SNAPSHOT_DIR) -> Snapshot:
+    """
+    The snapshot for the current faces_version, building it from the faces
+    table first if it is missing or stale.
+    """
+    current = Snapshot.current_version(root)
+    if current is not None and current == faces_version():
+        snap = Snapshot.latest(root)
+        if snap is not None and snap.version == current:
+            return snap
+    with _writer_lock(root):
+        # another worker may have written it while we waited for the lock
+        current = Snapshot.current_version(root)
+        if current is not None and current == faces_version():
+            snap = Snapshot.latest(root)
+            if snap is not None:
+                return snap
+        version, fids, uids, matrix = load_matrix_versioned()
+        Snapshot.write(version, fids, uids, matrix, root)
+    return Snapshot.open(version, root)
+
+
+def publish_snapshot(version, face_ids, user_ids, matrix, root: Path = SNAPSHOT_DIR):
+    """Write a generation from rows already in memory (no faces table read)."""
+    with _writer_lock(root):
+        current = Snapshot.current_version(root)
+        if current is None or current < version:
+            Snapshot.write(version, face_ids, user_ids, matrix, root)
+
+
+class SnapshotSync:
+    """
+    Per-process daemon thread that keeps a Gallery in step with the other
+    workers. Every poll compares faces_version with the version the gallery
+    already reflects: a gap of up to SNAPSHOT_CATCHUP_MAX changes is applied
+    in place from the face_changes log (like a local enroll/delete), a
+    bigger one adopts the shared snapshot. A process that changed faces
+    publishes a new generation from its in-memory rows at most every
+    SNAPSHOT_INTERVAL_S, for cold starts and far-behind workers; its own
+    writes never trigger a reload or a faces table read.
+    """
+
+    def __init__(
+        self,
+        gallery,
+        root: Path = SNAPSHOT_DIR,
+        poll_s: float = SNAPSHOT_POLL_S,
+        interval_s: float = SNAPSHOT_INTERVAL_S,
+    ):
+        self.gallery = gallery
+        self.root = root
+        self.poll_s = max(0.05, poll_s)
+        self.interval_s = max(0.0, interval_s)
+        self._dirty = threading.Event()
+        self._published_at = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._loop, name="gallery-snapshot", daemon=True
+        )
+        self._thread.start()
+
+    def mark_dirty(self) -> None:
+        self._dirty.set()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                time.sleep(self.poll_s)
+                self._catch_up()
+                if (
+                    self._dirty.is_set()
+                    and time.monotonic() - self._published_at >= self.interval_s
+                ):
+                    self._dirty.clear()
+                    self._publish()
+            except Exception as e:
+                print(f"[gallery] snapshot sync failed: {e}")
+
+    def _catch_up(self) -> None:
+        g = self.gallery
+        behind = faces_version() - g.applied_version
+        if behind <= 0:
+            return
+        if behind > SNAPSHOT_CATCHUP_MAX:
+            g.adopt(ensure_snapshot(self.root))
+            return
+        g.apply_changes(lambda since: changes_since(since, SNAPSHOT_CATCHUP_MAX))
+
+    def _publish(self) -> None:
+        self._published_at = time.monotonic()
+        rows = self.gallery.export_rows()
+        if rows is None:  # memory is not exactly one faces_version: read the table
+            ensure_snapshot(self.root)
+        else:
+            publish_snapshot(*rows, root=self.root)
+        if getattr(self.gallery.index, "wants_mapped", False):
+            snap = Snapshot.latest(self.root)
+            if snap is not None:
+                self.gallery.remap(snap)
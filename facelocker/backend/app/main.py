@@ -6,14 +6,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from .config import settings
-from .db import Base, engine
-from .mqtt_bridge import start_mqtt
+from .db import Base, add_missing_columns, engine
+from .models import Assignment, Event
+from .mqtt_bridge import start_mqtt, stop_mqtt
 
 # Routers
 from .routers import users, lockers, assignments, embeddings, events
-from .routers.faces import router as faces_router
-from .routers.recognize import router as recognize_router
 from .routers import assignments_resolver
+from .routers.search import router as search_router
+
+# Search-only nodes serve /api/recognize/vectors without OpenCV/InsightFace
+SEARCH_ONLY = os.getenv("FACE_SEARCH_ONLY", "false").lower() == "true"
 
 app = FastAPI(title="FaceLocker Backend")  # ← create app first
 
@@ -32,6 +35,8 @@ app.mount("/static/faces", StaticFiles(directory=str(faces_dir)), name="faces")
 
 # Create DB tables
 Base.metadata.create_all(bind=engine)
+add_missing_columns(Event)  # events.site_id
+add_missing_columns(Assignment)  # ix_assignments_user_active_created
 
 # Include routers AFTER app is created
 app.include_router(users.router)
@@ -39,8 +44,15 @@ app.include_router(lockers.router)
 app.include_router(assignments.router)
 app.include_router(embeddings.router)
 app.include_router(events.router)
-app.include_router(faces_router)
-app.include_router(recognize_router)
+app.include_router(search_router)
+if not SEARCH_ONLY:
+    from .routers.faces import router as faces_router
+    from .routers.recognize import router as recognize_router
+    from .routers.unlock import router as unlock_router
+
+    app.include_router(faces_router)
+    app.include_router(recognize_router)
+    app.include_router(unlock_router)
 app.include_router(assignments_resolver.router)
 
 
@@ -49,6 +61,11 @@ def on_startup():
     start_mqtt()
 
 
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_mqtt()  # flushes buffered events
+
+
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
@@ -5,12 +5,11 @@ from sqlalchemy import (
     Integer,
     String,
     DateTime,
-    Text,
     Float,
     ForeignKey,
     Boolean,
+    Index,
 )
-from sqlalchemy.orm import relationship
 from .db import Base
 
 
@@ -23,14 +22,7 @@ class User(Base):
     name = Column(String, nullable=True)
     status = Column(String, default="active")
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-    # One-to-many: User -> Embeddings
-    embeddings = relationship(
-        "Embedding",
-        back_populates="user",
-        cascade="all, delete-orphan",
-        passive_deletes=True,
-    )
+    # Face embeddings live in the face store (face/db.py `faces` table)
 
 
 class Locker(Base):
@@ -67,22 +59,10 @@ class Assignment(Base):
     active = Column(Boolean, default=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
-
-class Embedding(Base):
-    __tablename__ = "embeddings"
-
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(
-        String,
-        ForeignKey("users.user_id", ondelete="CASCADE"),
-        index=True,
-        nullable=False,
+    # "current assignment of a user": equality on user_id/active, newest first
+    __table_args__ = (
+        Index("ix_assignments_user_active_created", "user_id", "active", "created_at"),
     )
-    # Store vector as JSON-encoded string for SQLite compatibility
-    vec = Column(Text, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-    user = relationship("User", back_populates="embeddings")
 
 
 class Event(Base):
@@ -93,6 +73,7 @@ class Event(Base):
     type = Column(String, nullable=False)  # e.g. "unlock"
     user_id = Column(String, nullable=True)
     locker_id = Column(Integer, nullable=True)
+    site_id = Column(String, index=True, nullable=True)  # from the MQTT topic
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     # optional diagnostics/telemetry (safe to ignore in responses)
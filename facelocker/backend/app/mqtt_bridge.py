@@ -1,57 +1,224 @@
 ﻿# backend/app/mqtt_bridge.py
 import json
+import math
+import queue
 import threading
+import time
 import traceback
+import zlib
+from datetime import datetime
 import paho.mqtt.client as mqtt
 
+from .command_tracker import CommandTracker
 from .config import settings
-from .db import SessionLocal
-from .models import Event
+from .event_ingest import EventIngest
 
 TOPIC_TELE = f"sites/{settings.site_id}/locker/tele"
 TOPIC_DOOR = f"sites/{settings.site_id}/locker/door"
+# multi-site mode (MQTT_MULTI_SITE=true): every site on the broker
+TOPIC_ALL_SITES = "sites/+/locker/#"
+EVENT_KINDS = ("tele", "door")  # other locker topics (our own `cmd`) are ignored
+
+SHARD_QUEUE_MAX = 10000  # per worker
+RATE_WINDOW_S = 60.0  # time constant of the per-site msgs/s average
 
 _client = None
 _client_thread = None
+_shards = None
+
 
+def parse_topic(topic: str) -> tuple[str, str] | None:
+    """`sites/<site_id>/locker/<kind>` -> (site_id, kind); None otherwise."""
+    parts = topic.split("/")
+    if len(parts) != 4 or parts[0] != "sites" or parts[2] != "locker":
+        return None
+    return parts[1], parts[3]
 
-def _persist_event(payload: dict, topic: str) -> None:
-    """Persist an Event row from a received MQTT payload."""
+
+def _persist_event(payload: dict, site_id: str, kind: str) -> None:
+    """Queue an Event row from a received MQTT payload (written in batches)."""
     try:
-        with SessionLocal() as db:
-            e = Event(
+        EventIngest.get().submit(
+            {
                 # Required by models.py
-                type="door" if topic == TOPIC_DOOR else "tele",
-                user_id=payload.get("user_id"),
-                locker_id=payload.get("locker_id"),
+                "type": kind,
+                "user_id": payload.get("user_id"),
+                "locker_id": payload.get("locker_id"),
+                "site_id": site_id,
+                # receive time, not the batch's commit time
+                "created_at": datetime.utcnow(),
                 # Optional diagnostics
-                action=payload.get("status") or payload.get("action"),
-                result=payload.get("door_state") or payload.get("result"),
-                confidence=payload.get("confidence"),
-                liveness=payload.get("liveness"),
-                source=payload.get("source") or "mqtt",
-                request_id=payload.get("request_id"),
-            )
-            db.add(e)
-            db.commit()
+                "action": payload.get("status") or payload.get("action"),
+                "result": payload.get("door_state") or payload.get("result"),
+                "confidence": payload.get("confidence"),
+                "liveness": payload.get("liveness"),
+                "source": payload.get("source") or "mqtt",
+                "request_id": payload.get("request_id"),
+            }
+        )
     except Exception:
         print("MQTT persist error:\n", traceback.format_exc())
 
 
+class SiteStats:
+    """
+    Message counters for one site. Every field has a single writer: `counts`
+    and the rate belong to the site's shard worker, `dropped` to paho's
+    network thread (it counts messages that never reached the worker).
+    """
+
+    def __init__(self):
+        self.counts = {"tele": 0, "door": 0, "invalid": 0}
+        self.dropped = 0
+        self.first_seen = self.last_seen = time.time()
+        self.rate = 0.0  # messages/s, exponentially averaged over RATE_WINDOW_S
+
+    def seen(self, key: str) -> None:
+        now = time.time()
+        self.rate = (
+            self.rate * math.exp(-(now - self.last_seen) / RATE_WINDOW_S)
+            + 1.0 / RATE_WINDOW_S
+        )
+        self.last_seen = now
+        self.counts[key] += 1
+
+    def snapshot(self) -> dict:
+        idle = time.time() - self.last_seen
+        return {
+            **self.counts,
+            "dropped": self.dropped,
+            "msgs_per_s": round(self.rate * math.exp(-idle / RATE_WINDOW_S), 3),
+            "first_seen": datetime.utcfromtimestamp(self.first_seen).isoformat(),
+            "last_seen": datetime.utcfromtimestamp(self.last_seen).isoformat(),
+        }
+
+
+class SiteShards:
+    """
+    Worker threads that take message handling (JSON decode, event rows) off
+    paho's network thread. A site always maps to the same worker (crc32 of
+    its id), so each site's messages are handled in order while different
+    sites run in parallel. A full worker queue drops the message and counts
+    it against the site. Only `allowed` sites are tracked (any, when None,
+    up to `max_sites` of them); messages from other sites are rejected.
+    """
+
+    def __init__(
+        self, workers: int, allowed: set[str] | None = None, max_sites: int = 1000
+    ):
+        self.workers = max(1, workers)
+        self._queues = [queue.Queue(SHARD_QUEUE_MAX) for _ in range(self.workers)]
+        self.allowed = allowed
+        self.max_sites = max(1, max_sites)
+        self.sites: dict[str, SiteStats] = {}
+        self.rejected = 0  # written by paho's network thread only
+        self._sites_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(
+                target=self._loop, args=(q,), name=f"mqtt-shard-{i}", daemon=True
+            )
+            for i, q in enumerate(self._queues)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _admit(self, site_id: str) -> SiteStats | None:
+        if self.allowed is not None and site_id not in self.allowed:
+            return None
+        with self._sites_lock:
+            if len(self.sites) >= self.max_sites:
+                return None
+            return self.sites.setdefault(site_id, SiteStats())
+
+    def submit(self, site_id: str, kind: str, raw: bytes) -> None:
+        stats = self.sites.get(site_id) or self._admit(site_id)
+        if stats is None:
+            self.rejected += 1
+            if self.rejected & (self.rejected - 1) == 0:  # 1, 2, 4, ...
+                print(f"MQTT message from unknown site {site_id!r} rejected")
+            return
+        q = self._queues[zlib.crc32(site_id.encode()) % self.workers]
+        try:
+            q.put_nowait((site_id, stats, kind, raw))
+        except queue.Full:
+            stats.dropped += 1
+
+    def _loop(self, q: queue.Queue) -> None:
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            site_id, stats, kind, raw = item
+            try:
+                payload = json.loads(raw.decode("utf-8"))
+                if not isinstance(payload, dict):
+                    raise ValueError("not an object")
+            except Exception:
+                stats.seen("invalid")
+                print(f"MQTT invalid JSON on sites/{site_id}/locker/{kind}: {raw!r}")
+                continue
+            stats.seen(kind)
+            _persist_event(payload, site_id, kind)
+            if kind == "door" and payload.get("request_id"):
+                CommandTracker.get().ack(site_id, payload)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Handle everything already queued, then end the workers."""
+        for q in self._queues:
+            q.put(None)
+        for t in self._threads:
+            t.join(timeout)
+
+    def stats(self) -> dict:
+        with self._sites_lock:
+            sites = dict(self.sites)
+        return {
+            "multi_site": settings.mqtt_multi_site,
+            "workers": self.workers,
+            "rejected": self.rejected,
+            "queued": [q.qsize() for q in self._queues],
+            "sites": {sid: st.snapshot() for sid, st in sorted(sites.items())},
+        }
+
+
+def shards() -> SiteShards:
+    global _shards
+    if _shards is None:
+        if settings.mqtt_multi_site:
+            allowed = {s.strip() for s in settings.mqtt_sites if s.strip()} or None
+        else:
+            allowed = {settings.site_id}
+        _shards = SiteShards(settings.mqtt_workers, allowed, settings.mqtt_sites_max)
+    return _shards
+
+
+def publish_cmd(site_id: str, payload: dict, qos: int = 1) -> bool:
+    """
+    Publish a locker command (sites/<site_id>/locker/cmd) on the bridge's
+    connection. False if the bridge is not connected or paho refused it.
+    """
+    client = _client
+    if client is None or not client.is_connected():
+        return False
+    info = client.publish(f"sites/{site_id}/locker/cmd", json.dumps(payload), qos)
+    return info.rc == mqtt.MQTT_ERR_SUCCESS
+
+
 # Paho v2 callback signatures
 def on_connect(client, userdata, flags, reason_code, properties=None):
     print(f"MQTT connected: {reason_code}")
     # (Re)subscribe on connect
-    client.subscribe([(TOPIC_TELE, 0), (TOPIC_DOOR, 0)])
+    if settings.mqtt_multi_site:
+        client.subscribe(TOPIC_ALL_SITES, 0)
+    else:
+        client.subscribe([(TOPIC_TELE, 0), (TOPIC_DOOR, 0)])
 
 
 def on_message(client, userdata, msg):
-    try:
-        payload = json.loads(msg.payload.decode("utf-8"))
-    except Exception:
-        print(f"MQTT invalid JSON on {msg.topic}: {msg.payload!r}")
+    parsed = parse_topic(msg.topic)
+    if parsed is None or parsed[1] not in EVENT_KINDS:
         return
-    _persist_event(payload, msg.topic)
+    shards().submit(parsed[0], parsed[1], msg.payload)
 
 
 def start_mqtt():
@@ -78,3 +245,19 @@ def start_mqtt():
     _client.connect(settings.mqtt_host, settings.mqtt_port, keepalive=60)
     _client_thread = threading.Thread(target=_client.loop_forever, daemon=True)
     _client_thread.start()
+
+
+def stop_mqtt():
+    """Disconnect, finish queued messages, then commit any events still buffered."""
+    global _client, _client_thread, _shards
+    if _client is not None:
+        _client.disconnect()
+        if _client_thread is not None:
+            _client_thread.join(timeout=5)
+        _client, _client_thread = None, None
+    if _shards is not None:
+        _shards.stop()
+        _shards = None
+    ingest, EventIngest._instance = EventIngest._instance, None
+    if ingest is not None:
+        ingest.stop()
@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from pydantic import BaseModel
+from ..assignment_cache import OPEN_FILTER, ORDER_BY, AssignmentCache
 from ..db import get_db
 from ..models import Assignment, User, Locker
 from ..schemas import AssignmentOut
@@ -21,7 +22,8 @@ def create_assignment(payload: AssignmentCreate, db: Session = Depends(get_db)):
     # Validate FK presence
     if not db.query(User).filter(User.user_id == payload.user_id).first():
         raise HTTPException(status_code=404, detail="user_not_found")
-    if not db.query(Locker).filter(Locker.locker_id == payload.locker_id).first():
+    locker = db.query(Locker).filter(Locker.locker_id == payload.locker_id).first()
+    if not locker:
         raise HTTPException(status_code=404, detail="locker_not_found")
 
     # Two branches depending on whether your Assignment model has "active"
@@ -57,6 +59,7 @@ def create_assignment(payload: AssignmentCreate, db: Session = Depends(get_db)):
     db.add(row)
     db.commit()
     db.refresh(row)
+    AssignmentCache.get().put(row, locker.site_id)  # write-through
     return row
 
 
@@ -71,30 +74,20 @@ def list_assignments(
         q = q.filter(Assignment.user_id == user_id)
 
     # If you add "active"/"ended_at" later, this keeps working.
-    if only_open:
-        if hasattr(Assignment, "ended_at"):
-            q = q.filter(Assignment.ended_at == None)  # noqa: E711
-        elif hasattr(Assignment, "active"):
-            q = q.filter(Assignment.active == True)  # noqa: E712
+    if only_open and OPEN_FILTER is not None:
+        q = q.filter(OPEN_FILTER)
 
-    # No created_at in your model; fall back to id DESC as "most recent"
-    order_col = getattr(Assignment, "created_at", getattr(Assignment, "id"))
-    return q.order_by(order_col.desc()).all()
+    return q.order_by(ORDER_BY).all()
 
 
 @router.get("/current", response_model=AssignmentOut)
-def get_current_assignment(
-    user_id: str = Query(...),
-    db: Session = Depends(get_db),
-):
-    q = db.query(Assignment).filter(Assignment.user_id == user_id)
-    if hasattr(Assignment, "ended_at"):
-        q = q.filter(Assignment.ended_at == None)  # noqa: E711
-    elif hasattr(Assignment, "active"):
-        q = q.filter(Assignment.active == True)  # noqa: E712
-
-    order_col = getattr(Assignment, "created_at", getattr(Assignment, "id"))
-    row = q.order_by(order_col.desc()).first()
+def get_current_assignment(user_id: str = Query(...)):
+    row = AssignmentCache.get().for_user(user_id)
     if not row:
         raise HTTPException(404, "assignment_not_found")
     return row
+
+
+@router.get("/cache/stats")
+def assignment_cache_stats():
+    return AssignmentCache.get().stats()
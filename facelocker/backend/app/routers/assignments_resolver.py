@@ -1,28 +1,36 @@
 # backend/app/routers/assignments_resolver.py
 from fastapi import APIRouter, HTTPException, Query, Depends
 from sqlalchemy.orm import Session
+from ..assignment_cache import ORDER_BY, AssignmentCache
 from ..db import get_db
 from ..models import Assignment
 
 router = APIRouter(prefix="/api", tags=["assignments"])
 
 
+@router.on_event("startup")
+def _startup():
+    AssignmentCache.get().load()
+
+
+def find_assignment(db: Session, user_id: str, only_open: bool = True):
+    """
+    The user's most recent (open) assignment, or None. Open ones come from
+    AssignmentCache (a CachedAssignment, with its locker's site_id).
+    """
+    if only_open:
+        return AssignmentCache.get().for_user(user_id)
+    q = db.query(Assignment).filter(Assignment.user_id == user_id)
+    return q.order_by(ORDER_BY).first()
+
+
 @router.get("/resolve-locker")
 def resolve_locker(
     user_id: str = Query(...),
     only_open: bool = Query(True),
     db: Session = Depends(get_db),
 ):
-    q = db.query(Assignment).filter(Assignment.user_id == user_id)
-
-    if only_open:
-        if hasattr(Assignment, "ended_at"):
-            q = q.filter(Assignment.ended_at == None)  # noqa: E711
-        elif hasattr(Assignment, "active"):
-            q = q.filter(Assignment.active == True)  # noqa: E712
-
-    order_col = getattr(Assignment, "created_at", getattr(Assignment, "id"))
-    row = q.order_by(order_col.desc()).first()
+    row = find_assignment(db, user_id, only_open)
     if not row:
         raise HTTPException(404, "assignment_not_found")
 
@@ -1,37 +1,196 @@
 ﻿# backend/app/routers/embeddings.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+import base64
 import json
+import struct
+from typing import Iterator, List, Optional
+import numpy as np
 
-from ..db import get_db
-from ..models import Embedding
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import inspect, text
+
+from ..db import engine
 from ..schemas import EmbeddingOut
+from ..face.db import (
+    EMB_DIM,
+    changes_since,
+    faces_version,
+    import_embeddings,
+    init_db,
+    iter_embeddings,
+)
 
+# The face store (face/db.py `faces`, raw float32 blobs) is the only embedding
+# store; this router serves it to tablets that match on-device.
 router = APIRouter(prefix="/api/embeddings", tags=["embeddings"])
 
+FORMATS = ("json", "b64", "bin")
+CHANGES_MAX = 5000  # change-log entries per /changes page
+
+
+@router.on_event("startup")
+def _startup():
+    init_db()
+    _migrate_legacy_embeddings()
+
+
+def _migrate_legacy_embeddings() -> None:
+    """
+    Move rows of the old SQLAlchemy `embeddings` table (JSON text vectors)
+    into the face store once, then drop it. Vectors that are not EMB_DIM
+    long cannot be searched and are discarded.
+    """
+    if not inspect(engine).has_table("embeddings"):
+        return
+    with engine.begin() as conn:
+        rows = conn.execute(text("SELECT id, user_id, vec FROM embeddings")).all()
+        items, skipped = [], 0
+        for rid, uid, vec in rows:
+            try:
+                v = json.loads(vec) if isinstance(vec, str) else vec
+                if len(v) != EMB_DIM:
+                    raise ValueError
+                items.append((f"E_{rid}", uid, _unit(v)))
+            except Exception:
+                skipped += 1
+        moved = import_embeddings(items) if items else 0
+        conn.execute(text("DROP TABLE embeddings"))
+    print(f"[embeddings] moved {moved} legacy vectors to faces ({skipped} skipped)")
+
+
+def _unit(v):
+    v = np.asarray(v, dtype=np.float32)
+    return v / max(float(np.linalg.norm(v)), 1e-12)
+
+
+# ───────────────────────── Encoders ─────────────────────────
+
+
+def _b64(batches) -> Iterator[bytes]:
+    # {"dim", "dtype", "items": [{"face_id", "user_id", "vec": base64 <f4}]}
+    yield b'{"dim":%d,"dtype":"float32","items":[' % EMB_DIM
+    sep = b""
+    for batch in batches:
+        parts = [
+            json.dumps(
+                {
+                    "face_id": fid,
+                    "user_id": uid,
+                    "vec": _vec64(v),
+                }
+            ).encode()
+            for fid, uid, v in batch
+        ]
+        if parts:
+            yield sep + b",".join(parts)
+            sep = b","
+    yield b"]}"
+
+
+def _bin(batches) -> Iterator[bytes]:
+    # per face: u16 len + face_id, u16 len + user_id (utf-8), EMB_DIM x <f4
+    for batch in batches:
+        out = bytearray()
+        for fid, uid, v in batch:
+            for s in (fid.encode(), uid.encode()):
+                out += struct.pack("<H", len(s)) + s
+            out += v.astype("<f4").tobytes()
+        yield bytes(out)
+
+
+def _json(batches) -> Iterator[bytes]:
+    # legacy shape: [{"face_id", "user_id", "vec": [floats]}]
+    yield b"["
+    sep = b""
+    for batch in batches:
+        parts = [
+            json.dumps({"face_id": fid, "user_id": uid, "vec": v.tolist()}).encode()
+            for fid, uid, v in batch
+        ]
+        if parts:
+            yield sep + b",".join(parts)
+            sep = b","
+    yield b"]"
+
+
+def _vec64(v: np.ndarray) -> str:
+    return base64.b64encode(v.astype("<f4").tobytes()).decode()
+
+
+def _stream(request: Request, user_id: Optional[str], fmt: str) -> Response:
+    """
+    Full listing with ETag = revision + scope + format; a matching
+    If-None-Match gets 304. X-Gallery-Revision is the `since` to poll
+    /changes with next (rows written mid-stream come back as upserts there).
+    """
+    if fmt not in FORMATS:
+        raise HTTPException(400, f"format must be one of {', '.join(FORMATS)}")
+    rev = faces_version()
+    etag = f'W/"faces-{rev}-{user_id or "*"}-{fmt}"'
+    headers = {"ETag": etag, "X-Gallery-Revision": str(rev)}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    batches = iter_embeddings(user_id)
+    if fmt == "bin":
+        headers["X-Embedding-Dim"] = str(EMB_DIM)
+        return StreamingResponse(
+            _bin(batches), media_type="application/octet-stream", headers=headers
+        )
+    body = _b64(batches) if fmt == "b64" else _json(batches)
+    return StreamingResponse(body, media_type="application/json", headers=headers)
+
+
+# ───────────────────────── Routes ─────────────────────────
+
 
-def _parse_vec(v) -> List[float]:
-    # r.vec is Text (JSON). Be robust if it's already a list.
-    if isinstance(v, (list, tuple)):
-        try:
-            return [float(x) for x in v]
-        except Exception:
-            raise HTTPException(500, "Bad embedding format in DB (list)")
-    try:
-        parsed = json.loads(v)
-        return [float(x) for x in parsed]
-    except Exception:
-        raise HTTPException(500, "Bad embedding format in DB (json)")
+@router.get("/", responses={200: {"model": List[EmbeddingOut]}})
+def list_embeddings(request: Request, format: str = Query("json")):
+    """
+    Every enrolled face's embedding, streamed. format:
+      json (default) the original list of {"face_id", "user_id", "vec": [floats]}
+      b64  {"dim", "dtype", "items": [...]}; each vec is base64 of EMB_DIM
+           little-endian float32 (about 4x smaller)
+      bin  application/octet-stream records: u16 len + face_id, u16 len +
+           user_id (utf-8), then EMB_DIM x float32 LE (dim in X-Embedding-Dim)
+    """
+    return _stream(request, None, format)
 
 
-@router.get("/", response_model=List[EmbeddingOut])
-def list_embeddings(db: Session = Depends(get_db)):
-    rows = db.query(Embedding).all()
-    return [EmbeddingOut(user_id=r.user_id, vec=_parse_vec(r.vec)) for r in rows]
+@router.get("/changes")
+def embedding_changes(
+    since: int = Query(0, ge=0), limit: int = Query(CHANGES_MAX, ge=1, le=CHANGES_MAX)
+):
+    """
+    Delta sync: faces enrolled/replaced ("upserts", vec as base64 float32) and
+    deleted ("deletes", face_ids) after revision `since`, oldest first.
+    Poll again with since=`next`; `more` is true while a page was cut short.
+    A `since` ahead of the store (reset or restored from a backup) gets 410
+    resync_required: fetch the full listing and poll from its revision.
+    """
+    current, rows = changes_since(since, limit)
+    if since > current:
+        raise HTTPException(
+            410, "resync_required", headers={"X-Gallery-Revision": str(current)}
+        )
+    upserts, deletes = [], []
+    for _, fid, uid, vec in rows:
+        if vec is None:
+            deletes.append(fid)
+        else:
+            upserts.append({"face_id": fid, "user_id": uid, "vec": _vec64(vec)})
+    more = len(rows) == limit
+    return {
+        "since": since,
+        "next": rows[-1][0] if more else max(since, current),
+        "rev": current,
+        "more": more,
+        "dim": EMB_DIM,
+        "upserts": upserts,
+        "deletes": deletes,
+    }
 
 
-@router.get("/{user_id}", response_model=List[EmbeddingOut])
-def list_user_embeddings(user_id: str, db: Session = Depends(get_db)):
-    rows = db.query(Embedding).filter(Embedding.user_id == user_id).all()
-    return [EmbeddingOut(user_id=r.user_id, vec=_parse_vec(r.vec)) for r in rows]
+@router.get("/{user_id}", responses={200: {"model": List[EmbeddingOut]}})
+def list_user_embeddings(request: Request, user_id: str, format: str = Query("json")):
+    return _stream(request, user_id, format)
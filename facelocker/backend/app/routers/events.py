@@ -1,13 +1,29 @@
-﻿from fastapi import APIRouter, Depends
+﻿from typing import Optional
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from ..db import get_db
+from ..event_ingest import EventIngest
+from ..mqtt_bridge import shards
 from ..models import Event
 
 router = APIRouter(prefix="/api/events", tags=["events"])
 
 
 @router.get("/")
-def list_events(db: Session = Depends(get_db)):
-    return db.query(Event).order_by(Event.id.desc()).limit(200).all()
+def list_events(site_id: Optional[str] = Query(None), db: Session = Depends(get_db)):
+    q = db.query(Event)
+    if site_id:
+        q = q.filter(Event.site_id == site_id)
+    return q.order_by(Event.id.desc()).limit(200).all()
 
 
+@router.get("/ingest")
+def ingest_stats():
+    """Buffered MQTT event writer: queue depth, batch sizes, drops."""
+    return EventIngest.get().stats()
+
+
+@router.get("/sites")
+def site_stats():
+    """Per-site MQTT message counters and rates, plus shard queue depths."""
+    return shards().stats()
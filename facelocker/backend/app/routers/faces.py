@@ -1,16 +1,19 @@
 # backend/app/routers/faces.py
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-from typing import List, Optional
-from pathlib import Path
+from typing import List
 import uuid
-import numpy as np
-import cv2
-import os
-import shutil
 
-from ..face.engine import _FaceEngine
+from ..deps import run_inference
+from ..face.executor import InferenceExecutor, enroll_job
+from ..face.jobs import EnrollJob, EnrollJobs
+from ..face.images import THUMB_MAX_AGE, THUMB_SIZES, ImageStore, ThumbnailCache
 from ..face.db import add_face, delete_face, list_faces, init_db, FACES_DIR
+from ..face.db import close_conns
+from ..face.db import face_image_path
+from ..face.gallery import current_generation
 
 router = APIRouter(prefix="/api", tags=["faces"])
 
@@ -18,8 +21,14 @@ router = APIRouter(prefix="/api", tags=["faces"])
 @router.on_event("startup")
 async def _startup():
     init_db()
-    # warm engine once
-    _ = _FaceEngine.get()
+    # warm engine once (process workers warm themselves)
+    InferenceExecutor.get().warm()
+
+
+@router.on_event("shutdown")
+def _shutdown():
+    InferenceExecutor.get().shutdown()
+    close_conns()
 
 
 # ───────────────────────── Single enroll ─────────────────────────
@@ -32,127 +41,140 @@ async def enroll_face(
         raise HTTPException(status_code=400, detail="user_id required")
 
     raw = await image.read()
-    npimg = np.frombuffer(raw, np.uint8)
-    bgr = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-    if bgr is None:
-        raise HTTPException(400, "Invalid image")
-
-    eng = _FaceEngine.get()
-    faces = eng.embed(bgr)
-    if not faces:
-        raise HTTPException(422, "No face detected")
-
-    # choose largest box
-    faces.sort(key=lambda t: (t[0][2] - t[0][0]) * (t[0][3] - t[0][1]), reverse=True)
-    bbox, emb = faces[0]
-    # simple quality metric: box area / image area
-    h, w = bgr.shape[:2]
-    area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
-    quality = float(max(0.0, min(1.0, area / float(w * h))))
 
     face_id = f"F_{uuid.uuid4().hex[:8]}"
-    user_dir = FACES_DIR / user_id
-    user_dir.mkdir(parents=True, exist_ok=True)
-    img_path = user_dir / f"{face_id}.jpg"
-    cv2.imwrite(str(img_path), bgr)
+    img_path = FACES_DIR / user_id / f"{face_id}.jpg"
+
+    # decode + detect/embed run on the inference pool
+    res = await run_inference(enroll_job, raw)
+    if res.get("error") == "invalid_image":
+        raise HTTPException(400, "Invalid image")
+    if res.get("error") == "no_face_detected":
+        raise HTTPException(422, "No face detected")
 
-    add_face(face_id, user_id, emb, str(img_path), quality)
+    quality = res["quality"]
+    # thumbnail encode + write on the I/O pool; the row only once the file exists
+    store = ImageStore.get()
+    await store.save_async(str(img_path), res["crop"], raw)
+    try:
+        # SQLite write + gallery/index insert (may retrain IVF): off the loop
+        await run_in_threadpool(
+            add_face, face_id, user_id, res["embedding"], str(img_path), quality
+        )
+    except Exception:
+        store.release(img_path)
+        raise
     return {
         "ok": True,
         "face_id": face_id,
         "quality": quality,
         "image_url": f"/static/faces/{user_id}/{face_id}.jpg",
+        "gallery_generation": current_generation(),
     }
 
 
-# ───────────────────────── Batch enroll (optional) ─────────────────────────
-@router.post("/faces/batch")
+# ───────────────────────── Batch enroll (background job) ─────────────────────────
+@router.post("/faces/batch", status_code=202)
 async def enroll_faces_batch(
     user_id: str = Form(...),
     images: List[UploadFile] = File(...),
+    wait: bool = Form(False),
 ):
     """
-    Enroll multiple images in one request.
-    Returns an itemized result so partial successes are visible.
+    Enroll multiple images as a background job: returns 202 with a job_id;
+    poll GET /api/faces/jobs/{job_id} for progress and itemized results.
+    wait=true blocks until the job finishes and returns its final state.
+    Jobs are held by the worker process that accepted them (see EnrollJobs),
+    so polling needs that same worker.
     """
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id required")
     if not images:
         raise HTTPException(status_code=400, detail="no_files")
 
-    eng = _FaceEngine.get()
-    results = []
-    added = 0
-
     user_dir = FACES_DIR / user_id
-    user_dir.mkdir(parents=True, exist_ok=True)
-
-    for idx, image in enumerate(images):
-        try:
-            raw = await image.read()
-            npimg = np.frombuffer(raw, np.uint8)
-            bgr = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-            if bgr is None:
-                results.append(
-                    {"index": idx, "status": "error", "error": "invalid_image"}
-                )
-                continue
-
-            faces = eng.embed(bgr)
-            if not faces:
-                results.append(
-                    {"index": idx, "status": "error", "error": "no_face_detected"}
-                )
-                continue
-
-            faces.sort(
-                key=lambda t: (t[0][2] - t[0][0]) * (t[0][3] - t[0][1]), reverse=True
-            )
-            bbox, emb = faces[0]
-            h, w = bgr.shape[:2]
-            area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
-            quality = float(max(0.0, min(1.0, area / float(w * h))))
-
-            face_id = f"F_{uuid.uuid4().hex[:8]}"
-            img_path = user_dir / f"{face_id}.jpg"
-            cv2.imwrite(str(img_path), bgr)
-
-            add_face(face_id, user_id, emb, str(img_path), quality)
-            added += 1
-            results.append(
-                {
-                    "index": idx,
-                    "status": "ok",
-                    "face_id": face_id,
-                    "quality": quality,
-                    "image_url": f"/static/faces/{user_id}/{face_id}.jpg",
-                }
-            )
-        except Exception as e:
-            results.append({"index": idx, "status": "error", "error": str(e)})
-
+    items = []
+    for image in images:
+        face_id = f"F_{uuid.uuid4().hex[:8]}"
+        items.append((face_id, await image.read(), str(user_dir / f"{face_id}.jpg")))
+
+    job = EnrollJobs.get().start(EnrollJob(user_id, items))
+    if wait:
+        await job.done.wait()
+        return JSONResponse(
+            {**job.snapshot(), "gallery_generation": current_generation()}
+        )
     return {
         "ok": True,
-        "user_id": user_id,
-        "added": added,
-        "total": len(images),
-        "results": results,
+        "job_id": job.job_id,
+        "status_url": f"/api/faces/jobs/{job.job_id}",
+        "total": len(items),
     }
 
 
+@router.get("/faces/jobs/{job_id}")
+async def enroll_job_status(job_id: str, results: bool = True):
+    job = EnrollJobs.get().find(job_id)
+    if job is None:
+        raise HTTPException(404, "job_not_found")
+    return {**job.snapshot(results), "gallery_generation": current_generation()}
+
+
 # ───────────────────────── List ─────────────────────────
 @router.get("/faces")
 async def list_all_faces(user_id: str | None = None):
     return list_faces(user_id)
 
 
+# ───────────────────────── Thumbnail ─────────────────────────
+@router.get("/faces/{face_id}/thumb")
+def face_thumbnail(
+    face_id: str, request: Request, size: str = Query("m", pattern="^[a-z]+$")
+):
+    """
+    The face image scaled to a list-view variant (size = s | m | l, see
+    THUMB_SIZES), rendered once and then served from the disk cache. Sends
+    a strong ETag and Cache-Control; a matching If-None-Match gets 304.
+    """
+    if size not in THUMB_SIZES:
+        raise HTTPException(400, f"size must be one of {', '.join(THUMB_SIZES)}")
+    src = face_image_path(face_id)
+    if src is None:
+        raise HTTPException(404, "Not found")
+    cache = ThumbnailCache.get()
+    try:
+        tag = cache.etag(src, size)
+    except OSError:
+        raise HTTPException(404, "image_not_available")
+    headers = {
+        "ETag": f'"{tag}"',
+        "Cache-Control": f"public, max-age={THUMB_MAX_AGE}",
+    }
+    if f'"{tag}"' in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    try:
+        data = cache.thumbnail(src, size, tag)
+    except (OSError, ValueError):
+        raise HTTPException(404, "image_not_available")
+    return Response(data, media_type="image/jpeg", headers=headers)
+
+
+@router.get("/faces/thumbs/stats")
+def thumbnail_stats():
+    return ThumbnailCache.get().stats()
+
+
 # ───────────────────────── Delete single ─────────────────────────
 @router.delete("/faces/{face_id}")
 async def delete_face_route(face_id: str):
     n = delete_face(face_id)
     if n == 0:
         raise HTTPException(404, "Not found")
-    return {"ok": True, "deleted": face_id}
+    return {
+        "ok": True,
+        "deleted": face_id,
+        "gallery_generation": current_generation(),
+    }
 
 
 # ───────────────────────── Delete all by user ─────────────────────────
@@ -187,4 +209,10 @@ async def delete_faces_for_user(user_id: str):
     except Exception:
         pass
 
-    return {"ok": True, "user_id": user_id, "deleted": deleted, "face_ids": face_ids}
+    return {
+        "ok": True,
+        "user_id": user_id,
+        "deleted": deleted,
+        "face_ids": face_ids,
+        "gallery_generation": current_generation(),
+    }
@@ -1,61 +1,101 @@
 import os
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List, Dict
+import json
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from typing import List, Dict, Optional
 import numpy as np
-import cv2
 
-from ..face.engine import _FaceEngine, cosine_sim
-from ..face.db import all_embeddings
+from ..deps import recognize_frame, recognize_item, run_inference, det_size_param
+from ..face.executor import detect_job
+from ..face.batcher import MicroBatcher
+from ..face.gallery import Gallery
+from ..face.matching import match_response
 
 
 router = APIRouter(prefix="/api", tags=["recognition"])
 
-THRESHOLD = float(os.getenv("FACE_COS_THRESHOLD", 0.75))  # cosine similarity
-TOPK = 5
+# /api/detect is a cheap "is anyone there?" poll, so it defaults to a small input
+DETECT_DET_SIZE = int(os.getenv("FACE_DETECT_DET_SIZE", "320"))
+
+
+@router.on_event("startup")
+async def _startup():
+    # build the in-memory gallery once; later requests only run the matmul
+    Gallery.get()
 
 
 @router.post("/recognize")
-async def recognize(image: UploadFile = File(...)):
+async def recognize(
+    image: UploadFile = File(...),
+    det_size: Optional[int] = Form(None),  # e.g. 320 for close-up kiosk frames
+):
+    det_size = det_size_param(det_size)
     raw = await image.read()
-    npimg = np.frombuffer(raw, np.uint8)
-    bgr = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-    if bgr is None:
+    dets = await recognize_frame(raw, det_size)
+    if dets is None:
         raise HTTPException(400, "Invalid image")
-
-    eng = _FaceEngine.get()
-    dets = eng.embed(bgr)
     if not dets:
         return {"faces": []}
 
-    # Load gallery
-    gallery = all_embeddings()  # list of (face_id, user_id, emb)
-    if not gallery:
-        return {"faces": [], "error": "gallery_empty"}
-
-    results = []
-    for bbox, qemb in dets:
-        # compare to gallery
-        sims = []
-        for fid, uid, gemb in gallery:
-            sims.append((fid, uid, cosine_sim(qemb, gemb)))
-        sims.sort(key=lambda x: x[2], reverse=True)
-        top = sims[:TOPK]
-        best = top[0]
-        match = None
-        if best[2] >= THRESHOLD:
-            match = {
-                "user_id": best[1],
-                "face_id": best[0],
-                "similarity": round(float(best[2]), 4),
-            }
-        results.append(
-            {
-                "bbox": [float(v) for v in bbox],
-                "top": [
-                    {"face_id": fid, "user_id": uid, "similarity": round(float(s), 4)}
-                    for fid, uid, s in top
-                ],
-                "best": match,
-            }
-        )
-    return {"faces": results}
+    return _match_response(dets)
+
+
+@router.post("/recognize/aligned")
+async def recognize_aligned(
+    face: Optional[UploadFile] = File(None),
+    landmarks: Optional[str] = Form(None),
+    aligned: Optional[UploadFile] = File(None),
+):
+    """
+    Recognize a face the client has already located, skipping detection:
+      - face + landmarks: cropped face image plus its 5 landmarks as JSON
+        [[x, y], ...] in crop pixels (eyes, nose, mouth corners); aligned here.
+        Keep some margin around the face: alignment cannot use pixels outside it.
+      - aligned: raw 112x112x3 uint8 BGR buffer (37632 bytes), embedded as-is.
+    """
+    if aligned is not None:
+        raw = await aligned.read()
+        dets = await recognize_item("aligned", raw)
+        if dets is None:
+            raise HTTPException(400, "aligned must be 112x112x3 uint8 BGR bytes")
+    elif face is not None and landmarks:
+        try:
+            kps = json.loads(landmarks)
+            if len(kps) != 5 or any(len(p) != 2 for p in kps):
+                raise ValueError
+            kps = [[float(x), float(y)] for x, y in kps]
+        except Exception:
+            raise HTTPException(400, "landmarks must be 5 [x, y] pairs")
+        raw = await face.read()
+        dets = await recognize_item("crop", raw, kps)
+        if dets is None:
+            raise HTTPException(400, "Invalid image")
+    else:
+        raise HTTPException(400, "send either aligned, or face + landmarks")
+    return _match_response(dets)
+
+
+def _match_response(dets) -> dict:
+    """Search the gallery for [(bbox, embedding), ...] and build top/best."""
+    return match_response(
+        np.stack([qemb for _, qemb in dets]), [bbox for bbox, _ in dets]
+    )
+
+
+@router.post("/detect")
+async def detect(
+    image: UploadFile = File(...),
+    det_size: Optional[int] = Form(None),
+):
+    """Boxes + 5-point landmarks only (no embeddings, no gallery search)."""
+    det_size = det_size_param(det_size) or DETECT_DET_SIZE
+    raw = await image.read()
+    faces = await run_inference(detect_job, raw, det_size)
+    if faces is None:
+        raise HTTPException(400, "Invalid image")
+    return {"faces": faces, "det_size": det_size}
+
+
+@router.get("/recognize/stats")
+def recognize_stats():
+    """Micro-batching histogram (batch size -> count) for throughput tuning."""
+    return MicroBatcher.get().stats()
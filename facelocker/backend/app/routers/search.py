@@ -0,0 +1,39 @@
+# backend/app/routers/search.py
+from fastapi import APIRouter, HTTPException, Request, Query
+import numpy as np
+
+from ..face.db import init_db
+from ..face.gallery import Gallery
+from ..face.matching import match_response
+
+# No OpenCV / InsightFace imports here: this router also runs on search-only nodes.
+router = APIRouter(prefix="/api", tags=["recognition"])
+
+EMBED_DIM = 512
+
+
+@router.on_event("startup")
+async def _startup():
+    init_db()
+    Gallery.get()
+
+
+@router.post("/recognize/vectors")
+async def recognize_vectors(request: Request, dim: int = Query(EMBED_DIM)):
+    """
+    Gallery search for embeddings computed on the client.
+    Body (application/octet-stream): one or more little-endian float32
+    vectors of `dim` values, concatenated. Returns the /api/recognize
+    top/best structure, one entry per vector (bbox is null).
+    """
+    body = await request.body()
+    if dim != EMBED_DIM:
+        raise HTTPException(400, f"dim must be {EMBED_DIM}")
+    if not body or len(body) % (4 * dim):
+        raise HTTPException(400, f"body must be N x {dim} float32 (little-endian)")
+
+    q = np.frombuffer(body, dtype="<f4").reshape(-1, dim).astype(np.float32)
+    norms = np.linalg.norm(q, axis=1, keepdims=True)
+    if not np.all(np.isfinite(q)) or np.any(norms == 0):
+        raise HTTPException(400, "vectors must be finite and non-zero")
+    return match_response(q / norms)
@@ -0,0 +1,196 @@
+# backend/app/routers/unlock.py
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+import numpy as np
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from ..command_tracker import CommandTracker
+from ..config import settings
+from ..db import SessionLocal
+from ..deps import det_size_param, recognize_frame
+from ..event_ingest import EventIngest
+from ..face.matching import match_response
+from ..models import User
+from .assignments_resolver import find_assignment
+
+router = APIRouter(prefix="/api", tags=["unlock"])
+
+UNLOCK_DURATION_MS = 1200  # relay pulse, same default as the tablet and the ESP
+UNLOCK_DURATION_MIN_MS, UNLOCK_DURATION_MAX_MS = 100, 5000
+
+
+class _Stages:
+    """Wall-clock milliseconds per pipeline stage, for the response."""
+
+    def __init__(self):
+        self.t0 = self.last = time.perf_counter()
+        self.ms: dict[str, float] = {}
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.ms[stage] = round((now - self.last) * 1000.0, 2)
+        self.last = now
+
+    def done(self) -> dict:
+        return {**self.ms, "total": round((self.last - self.t0) * 1000.0, 2)}
+
+
+@router.post("/unlock")
+async def recognize_and_unlock(
+    image: UploadFile = File(...),
+    det_size: Optional[int] = Form(None),
+    duration_ms: int = Form(
+        UNLOCK_DURATION_MS, ge=UNLOCK_DURATION_MIN_MS, le=UNLOCK_DURATION_MAX_MS
+    ),
+    liveness: Optional[float] = Form(None),  # from the tablet's own check
+    wait_ack: bool = Form(False),
+):
+    """
+    One round trip from camera frame to relay: recognize the largest face,
+    check the user is active, resolve their active assignment and publish
+    the unlock `cmd` on the bridge's MQTT connection (the same payload as
+    infra/dev/publish_unlock.py). Refusals come back as ok=false with a
+    `reason`; every response carries `timings_ms` per stage. Database work
+    runs on the threadpool, never on the event loop. 503 if the
+    bridge is not connected. wait_ack=true also waits for the controller's
+    door ack and returns 504 with reason "ack_unconfirmed" if none arrives
+    (the door may still have opened; the command is never re-sent by
+    default); otherwise poll GET /api/unlock/commands/{request_id}.
+    """
+    det_size = det_size_param(det_size)
+    stages = _Stages()
+    raw = await image.read()
+    stages.mark("read")
+
+    dets = await recognize_frame(raw, det_size)
+    stages.mark("recognize")
+    if dets is None:
+        raise HTTPException(400, "Invalid image")
+    if not dets:
+        return await _denied("no_face_detected", stages)
+
+    # kiosk frames: the person at the door is the biggest face
+    bbox, emb = max(dets, key=lambda d: (d[0][2] - d[0][0]) * (d[0][3] - d[0][1]))
+    match = match_response(np.asarray([emb]), [bbox])
+    best = match["faces"][0]["best"] if match["faces"] else None
+    stages.mark("match")
+    if best is None:
+        return await _denied(match.get("error", "no_match"), stages)
+    user_id, similarity = best["user_id"], best["similarity"]
+
+    reason, row = await run_in_threadpool(_lookup, user_id)
+    stages.mark("lookup")
+    if reason is not None:
+        return await _denied(reason, stages, user_id, similarity)
+    site_id = row.site_id or settings.site_id
+
+    request_id = f"srv-{uuid.uuid4().hex[:12]}"
+    cmd = {
+        "request_id": request_id,
+        "user_id": user_id,
+        "locker_id": row.locker_id,
+        "action": "unlock",
+        "duration_ms": duration_ms,
+        "confidence": similarity,
+        "liveness": liveness,
+        "source": "backend",
+    }
+    pending = CommandTracker.get().send(site_id, cmd)
+    sent = pending.status != "unsent"
+    stages.mark("publish")
+    await run_in_threadpool(
+        _record, cmd, site_id, "sent" if sent else "mqtt_unavailable"
+    )
+    ack = None
+    if sent and wait_ack:
+        ack = await asyncio.wrap_future(pending.future)
+        stages.mark("ack")
+
+    body = {
+        "ok": sent,
+        "user_id": user_id,
+        "locker_id": row.locker_id,
+        "site_id": site_id,
+        "request_id": request_id,
+        "similarity": similarity,
+        "face_id": best["face_id"],
+        "timings_ms": stages.done(),
+    }
+    if not sent:
+        body["reason"] = "mqtt_unavailable"
+        return JSONResponse(body, status_code=503)
+    if ack is not None:
+        body["ack"] = ack
+        if ack["status"] != "acked":
+            body.update(ok=False, reason="ack_unconfirmed")
+            return JSONResponse(body, status_code=504)
+    return body
+
+
+@router.get("/unlock/commands/{request_id}")
+def unlock_command_status(request_id: str):
+    """pending | acked | unconfirmed for a recent unlock, with its ack latency."""
+    status = CommandTracker.get().status(request_id)
+    if status is None:
+        raise HTTPException(404, "command_not_found")
+    return status
+
+
+@router.get("/unlock/acks")
+def unlock_ack_stats():
+    """Command -> door-ack latency percentiles per locker and controller."""
+    return CommandTracker.get().stats()
+
+
+def _lookup(user_id: str):
+    """(refusal reason or None, open assignment) for a matched user."""
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.user_id == user_id).first()
+        if user is None or (user.status or "active") != "active":
+            return "user_inactive", None
+        row = find_assignment(db, user_id)
+    if row is None:
+        return "assignment_not_found", None
+    return None, row
+
+
+async def _denied(reason: str, stages: _Stages, user_id=None, similarity=None) -> dict:
+    if user_id is not None:
+        await run_in_threadpool(
+            _record,
+            {"user_id": user_id, "confidence": similarity, "request_id": None},
+            settings.site_id,
+            reason,
+        )
+    return {
+        "ok": False,
+        "reason": reason,
+        "user_id": user_id,
+        "similarity": similarity,
+        "timings_ms": stages.done(),
+    }
+
+
+def _record(cmd: dict, site_id: str, result: str) -> None:
+    """Audit row in `events` (buffered, like MQTT events)."""
+    EventIngest.get().submit(
+        {
+            "type": "unlock",
+            "user_id": cmd.get("user_id"),
+            "locker_id": cmd.get("locker_id"),
+            "site_id": site_id,
+            "created_at": datetime.utcnow(),
+            "action": "unlock",
+            "result": result,
+            "confidence": cmd.get("confidence"),
+            "liveness": cmd.get("liveness"),
+            "source": "backend",
+            "request_id": cmd.get("request_id"),
+        }
+    )
@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, Path as FPath, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
+from ..assignment_cache import AssignmentCache
 from ..db import get_db
 from ..models import User
 from ..schemas import UserOut, UserCreate, UserUpdate  # <- ensure these exist
@@ -110,6 +111,7 @@ def delete_user(user_id: str = FPath(...), db: Session = Depends(get_db)):
 
     db.delete(row)
     db.commit()
+    AssignmentCache.get().drop_user(user_id)  # assignments cascade with the user
 
     # also remove all face rows + image files for this user
     try:
@@ -48,8 +48,9 @@ class AssignmentOut(ORMModel):
 
 
 class EmbeddingOut(ORMModel):
+    face_id: str
     user_id: str
-    vec: List[float]  # router must json-decode DB text to list[float]
+    vec: List[float]  # GET /api/embeddings/ default (format=json) item
 
 
 class EventOut(ORMModel):
@@ -1,7 +1,6 @@
 ﻿# backend/app/seed_dev.py
-import json
 from .db import SessionLocal, Base, engine
-from .models import User, Locker, Assignment, Embedding
+from .models import User, Locker, Assignment
 
 
 def seed():
@@ -29,11 +28,7 @@ def seed():
         if not assign:
             db.add(Assignment(user_id="U_0001", locker_id=12))
 
-        # Optional: a tiny example embedding vector
-        emb = db.query(Embedding).filter_by(user_id="U_0001").first()
-        if not emb:
-            vec = json.dumps([0.05, 0.1, 0.2, 0.15, 0.0, 0.3])  # JSON string
-            db.add(Embedding(user_id="U_0001", vec=vec))
+        # Face embeddings are enrolled through POST /api/faces (face store)
 
         db.commit()
         print("Seeded: U_0001 -> Locker 12")
@@ -0,0 +1,15 @@
+# backend/tests/conftest.py
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The app reads its paths from the environment at import time: point them at
+# a scratch directory before any test imports backend.app.
+_tmp = Path(tempfile.mkdtemp(prefix="facelocker-tests-"))
+os.environ.setdefault("DB_PATH", str(_tmp / "faces.db"))
+os.environ.setdefault("FACES_DIR", str(_tmp / "faces"))
+os.environ.setdefault("BACKEND_DB_URL", f"sqlite:///{_tmp / 'backend.db'}")
+os.environ.setdefault("FACE_SNAPSHOT", "false")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
@@ -0,0 +1,63 @@
+# backend/tests/test_batcher.py
+import asyncio
+from contextlib import contextmanager
+
+import numpy as np
+
+from backend.app.face import executor
+from backend.app.face.batcher import MicroBatcher
+from backend.app.face.executor import InferenceExecutor, ItemFailed
+
+
+class _FakeEngine:
+    @contextmanager
+    def lease(self):
+        yield self
+
+    def embed_aligned(self, crops):
+        return [np.ones(4, dtype=np.float32) for _ in crops]
+
+
+def _prepare(eng, kind, raw, arg):
+    if raw == b"bad":
+        raise ValueError("corrupt frame")
+    if raw == b"undecodable":
+        return None
+    return [[0.0, 0.0, 1.0, 1.0]], [raw]
+
+
+def test_bad_item_fails_alone(monkeypatch):
+    monkeypatch.setattr(
+        executor.EnginePool, "get", classmethod(lambda cls: _FakeEngine())
+    )
+    monkeypatch.setattr(executor, "_prepare_item", _prepare)
+    monkeypatch.setattr(
+        InferenceExecutor, "_instance", InferenceExecutor(workers=1, kind="thread")
+    )
+    batcher = MicroBatcher(window_ms=50, max_batch=3)
+
+    async def go():
+        return await asyncio.gather(
+            batcher.submit("frame", b"good"),
+            batcher.submit("frame", b"bad"),
+            batcher.submit("frame", b"undecodable"),
+            return_exceptions=True,
+        )
+
+    good, bad, undecodable = asyncio.run(go())
+    assert batcher.histogram[3] == 1  # one batch
+    assert len(good) == 1 and good[0][0] == [0.0, 0.0, 1.0, 1.0]
+    assert isinstance(bad, ItemFailed) and "corrupt frame" in str(bad)
+    assert undecodable is None
+
+
+def test_batch_job_reports_per_item(monkeypatch):
+    monkeypatch.setattr(
+        executor.EnginePool, "get", classmethod(lambda cls: _FakeEngine())
+    )
+    monkeypatch.setattr(executor, "_prepare_item", _prepare)
+    out = executor.recognize_batch_job(
+        [("frame", b"bad", None), ("frame", b"ok", None)]
+    )
+    assert isinstance(out[0], ItemFailed)
+    assert len(out[1]) == 1
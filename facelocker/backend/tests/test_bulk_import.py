@@ -0,0 +1,71 @@
+# backend/tests/test_bulk_import.py
+import argparse
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backend.app.face import bulk_import
+from backend.app.face.db import get_conn
+
+
+def _fake_enroll(raw: bytes) -> dict:
+    seed = int.from_bytes(hashlib.sha256(raw).digest()[:4], "little")
+    emb = np.random.default_rng(seed).standard_normal(512).astype(np.float32)
+    return {
+        "embedding": emb / np.linalg.norm(emb),
+        "quality": 1.0,
+        "crop": np.full((16, 16, 3), 128, np.uint8),
+    }
+
+
+def _import(src, tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(bulk_import, "enroll_job", _fake_enroll)
+    monkeypatch.setattr(
+        bulk_import,
+        "ProcessPoolExecutor",
+        lambda workers, **kw: ThreadPoolExecutor(workers),
+    )
+    args = argparse.Namespace(
+        src=str(src),
+        workers=2,
+        batch=10,
+        checkpoint=str(tmp_path / f"{src.name}.import.jsonl"),
+    )
+    assert bulk_import.run_import(args) == 0
+
+
+def _faces(user_id: str) -> set[str]:
+    with get_conn() as c:
+        rows = c.execute("SELECT face_id FROM faces WHERE user_id=?", (user_id,))
+        return {r[0] for r in rows}
+
+
+def _tree(root, photos: dict[str, bytes]):
+    for name, data in photos.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_bytes(data)
+    return root
+
+
+def test_trees_with_overlapping_paths_both_enroll(tmp_path, monkeypatch):
+    a = _tree(tmp_path / "cohort-a", {"U_BI01/IMG_0001.jpg": b"photo a"})
+    b = _tree(tmp_path / "cohort-b", {"U_BI01/IMG_0001.jpg": b"photo b"})
+
+    _import(a, tmp_path, monkeypatch)
+    assert len(_faces("U_BI01")) == 1
+    _import(b, tmp_path, monkeypatch)
+    assert len(_faces("U_BI01")) == 2
+
+
+def test_same_photo_is_enrolled_once(tmp_path, monkeypatch):
+    photos = {"U_BI02/1.jpg": b"same", "U_BI02/2.jpg": b"other"}
+    tree = _tree(tmp_path / "cohort-c", photos)
+    _import(tree, tmp_path, monkeypatch)
+    (tree / "U_BI02/3.jpg").write_bytes(b"same")  # a renamed copy
+
+    _import(tree, tmp_path, monkeypatch)
+    assert _faces("U_BI02") == {
+        bulk_import.face_id_for("U_BI02", b"same"),
+        bulk_import.face_id_for("U_BI02", b"other"),
+    }
@@ -0,0 +1,58 @@
+# backend/tests/test_embeddings.py
+import base64
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app.face import db as face_db
+from backend.app.face.images import ImageStore
+from backend.app.routers import embeddings
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(embeddings.router)
+    return TestClient(app)
+
+
+def _vec(seed: int) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal(face_db.EMB_DIM)
+    return (v / np.linalg.norm(v)).astype(np.float32)
+
+
+def test_default_listing_is_the_legacy_json_list():
+    face_db.init_db()
+    face_db.import_embeddings([("E_list", "U_EMB1", _vec(1))])
+    with _client() as client:
+        rows = client.get("/api/embeddings/").json()
+        assert isinstance(rows, list)
+        row = next(r for r in rows if r["face_id"] == "E_list")
+        assert row["user_id"] == "U_EMB1" and len(row["vec"]) == face_db.EMB_DIM
+
+        body = client.get("/api/embeddings/", params={"format": "b64"}).json()
+        item = next(i for i in body["items"] if i["face_id"] == "E_list")
+        vec = np.frombuffer(base64.b64decode(item["vec"]), "<f4")
+        assert np.allclose(vec, row["vec"])
+
+
+def test_deleting_a_row_without_image_releases_nothing(monkeypatch):
+    face_db.init_db()
+    face_db.import_embeddings([("E_noimg", "U_EMB2", _vec(2))])
+    released = []
+    monkeypatch.setattr(ImageStore, "release", lambda self, p: released.append(p))
+    assert face_db.delete_face("E_noimg") == 1
+    assert released == []
+
+
+def test_changes_ahead_of_the_store_require_a_resync():
+    face_db.init_db()
+    with _client() as client:
+        current = int(client.get("/api/embeddings/").headers["X-Gallery-Revision"])
+        ok = client.get("/api/embeddings/changes", params={"since": current})
+        assert ok.status_code == 200 and ok.json()["next"] == current
+
+        r = client.get("/api/embeddings/changes", params={"since": current + 50})
+        assert r.status_code == 410
+        assert r.json()["detail"] == "resync_required"
+        assert r.headers["X-Gallery-Revision"] == str(current)
@@ -0,0 +1,43 @@
+# backend/tests/test_images.py
+import numpy as np
+
+from backend.app.face.images import ImageStore, ThumbnailCache
+
+
+def _crop(seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 255, (160, 120, 3), dtype=np.uint8)
+
+
+def test_blobs_live_outside_the_static_root(tmp_path):
+    root, blobs = tmp_path / "faces", tmp_path / "face_blobs"
+    store = ImageStore(root, keep_originals=False, blob_dir=blobs)
+    face = root / "U_IMG1" / "F_1.jpg"
+    store.save(str(face), _crop())
+    assert face.exists()
+    assert [p.name for p in root.iterdir()] == ["U_IMG1"]
+    assert len(list(blobs.rglob("*.jpg"))) == 1
+
+    store.release(face)
+    assert not face.exists()
+    assert list(blobs.rglob("*.jpg")) == []
+
+
+def test_legacy_blob_dir_is_moved_out(tmp_path):
+    root, blobs = tmp_path / "faces", tmp_path / "face_blobs"
+    (root / "_blobs" / "ab").mkdir(parents=True)
+    (root / "_blobs" / "ab" / "abc.jpg").write_bytes(b"x")
+    ImageStore(root, keep_originals=False, blob_dir=blobs)
+    assert not (root / "_blobs").exists()
+    assert (blobs / "ab" / "abc.jpg").read_bytes() == b"x"
+
+
+def test_full_size_variant_is_the_stored_bytes(tmp_path):
+    root = tmp_path / "faces"
+    store = ImageStore(root, keep_originals=False, blob_dir=tmp_path / "blobs")
+    face = root / "U_IMG2" / "F_2.jpg"
+    store.save(str(face), _crop(1))
+    cache = ThumbnailCache(tmp_path / "thumbs")
+    assert cache.thumbnail(face, "l") == face.read_bytes()
+    small = cache.thumbnail(face, "s")
+    assert small != face.read_bytes() and small[:3] == b"\xff\xd8\xff"
@@ -0,0 +1,51 @@
+# backend/tests/test_index.py
+import numpy as np
+
+from backend.app.face.index import IVFIndex, QuantizedIndex, _flat_search
+
+
+def _gallery(tmp_path, n=300, dim=64):
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((n, dim)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.save(tmp_path / "gallery.npy", matrix)
+    return matrix, np.load(tmp_path / "gallery.npy", mmap_mode="r")
+
+
+def test_int8_codes_only_over_a_mapped_matrix(tmp_path):
+    matrix, mapped = _gallery(tmp_path)
+    index = QuantizedIndex(rerank=8)
+
+    index.reset(matrix, None)  # private float32: codes would add memory
+    assert index.prepare() is None
+
+    index.reset(mapped, None)
+    assert index.codes.dtype == np.int8
+    alive = np.ones(len(matrix), dtype=bool)
+    q = matrix[:5]
+    hits = index.search(index.prepare(), q, mapped, alive, 3)
+    exact = _flat_search(q, matrix, alive, 3)
+    for (idx, sims), (e_idx, e_sims) in zip(hits, exact):
+        assert idx[0] == e_idx[0]
+        assert np.isclose(sims[0], e_sims[0])
+
+    index.append(len(matrix), matrix, None)  # the gallery copied the mapping
+    assert index.prepare() is None and index.codes is None
+
+
+def test_ivf_batch_search_matches_single_queries(tmp_path):
+    matrix, _ = _gallery(tmp_path, n=2000)
+    ids = np.asarray([f"F_{i}" for i in range(len(matrix))])
+    index = IVFIndex(path=tmp_path / "g.ivf.npz", nlist=16, nprobe=4, min_rows=0)
+    index.reset(matrix, ids)
+    alive = np.ones(len(matrix), dtype=bool)
+    alive[::3] = False
+    q = matrix[1:9]
+    batch = index.search(index.prepare(), q, matrix, alive, 5)
+    for qi, (idx, sims) in zip(q, batch):
+        one_idx, one_sims = index.search(
+            index.prepare(), qi[None, :], matrix, alive, 5
+        )[0]
+        assert list(idx) == list(one_idx) and np.allclose(sims, one_sims)
+        assert alive[idx].all()
+    assert [p.name for p in tmp_path.iterdir() if "ivf" in p.name] == ["g.ivf.npz"]
@@ -0,0 +1,43 @@
+# backend/tests/test_mqtt_bridge.py
+import threading
+
+from backend.app import mqtt_bridge
+from backend.app.event_ingest import EventIngest
+from backend.app.mqtt_bridge import SiteShards
+
+
+def test_unknown_sites_are_rejected(monkeypatch):
+    monkeypatch.setattr(mqtt_bridge, "_persist_event", lambda *a: None)
+    shards = SiteShards(2, allowed={"site-a", "site-b"})
+    for site in ("site-a", "site-b", "rogue-1", "rogue-2", "site-a"):
+        shards.submit(site, "tele", b'{"locker_id": "L1"}')
+    shards.stop()
+    assert sorted(shards.sites) == ["site-a", "site-b"]
+    assert shards.sites["site-a"].counts["tele"] == 2
+    assert shards.rejected == 2
+
+
+def test_site_count_is_capped(monkeypatch):
+    monkeypatch.setattr(mqtt_bridge, "_persist_event", lambda *a: None)
+    shards = SiteShards(1, max_sites=3)
+    for i in range(10):
+        shards.submit(f"site-{i}", "tele", b"{}")
+    shards.stop()
+    assert len(shards.sites) == 3
+    assert shards.rejected == 7
+
+
+def test_ingest_counters_from_many_threads():
+    ingest = EventIngest(queue_max=1, block_ms=0, flush_ms=10_000, batch_max=10**6)
+    ingest._closing.set()  # every submit drops: only the counters are exercised
+
+    def hammer():
+        for _ in range(2000):
+            ingest.submit({})
+
+    threads = [threading.Thread(target=hammer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert ingest.received == ingest.dropped == 8000
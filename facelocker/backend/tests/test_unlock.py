@@ -0,0 +1,42 @@
+# backend/tests/test_unlock.py
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app.routers import unlock
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(unlock.router)
+    return TestClient(app)
+
+
+def test_no_face_is_denied(monkeypatch):
+    async def no_faces(raw, det_size=None):
+        return []
+
+    monkeypatch.setattr(unlock, "recognize_frame", no_faces)
+    r = _client().post("/api/unlock", files={"image": ("f.jpg", b"jpeg")})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["ok"] is False
+    assert body["reason"] == "no_face_detected"
+    assert "recognize" in body["timings_ms"]
+
+
+def test_undecodable_frame_is_400(monkeypatch):
+    async def undecodable(raw, det_size=None):
+        return None
+
+    monkeypatch.setattr(unlock, "recognize_frame", undecodable)
+    r = _client().post("/api/unlock", files={"image": ("f.jpg", b"junk")})
+    assert r.status_code == 400
+
+
+def test_duration_is_clamped():
+    r = _client().post(
+        "/api/unlock",
+        files={"image": ("f.jpg", b"jpeg")},
+        data={"duration_ms": "60000"},
+    )
+    assert r.status_code == 422
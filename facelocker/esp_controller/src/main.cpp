@@ -63,17 +63,17 @@ void publishTele(bool online, bool retained)
 }
 
 // ======== RELAY ========
-void pulseRelay(int lockerId, int durationMs)
+bool pulseRelay(int lockerId, int durationMs)
 {
     if (lockerId < 1 || lockerId > MAX_LOCKER_ID)
     {
         LOGF("[RELAY] invalid lockerId=%d\n", lockerId);
-        return;
+        return false;
     }
     if (lockerId <= LOCKER_OFFSET || lockerId > LOCKER_OFFSET + NUM_CHANNELS)
     {
         LOGF("[RELAY] lockerId=%d not assigned to this controller\n", lockerId);
-        return;
+        return false;
     }
 
     int localId = lockerId - LOCKER_OFFSET;
@@ -81,7 +81,7 @@ void pulseRelay(int lockerId, int durationMs)
     if (pin < 0)
     {
         LOGF("[RELAY] lockerId=%d (local=%d) has no pin mapping\n", lockerId, localId);
-        return;
+        return false;
     }
 
     LOGF("[RELAY] locker_id=%d -> pin=%d, pulse=%dms (active_%s)\n",
@@ -91,6 +91,33 @@ void pulseRelay(int lockerId, int durationMs)
     delay(durationMs);
     digitalWrite(pin, RELAY_OFF());
     LOGF("[RELAY] done\n");
+    return true;
+}
+
+// ======== REQUEST DEDUP ========
+// The backend may re-publish an unacked unlock with the same request_id
+// (and QoS 1 can redeliver); remember the ids we already pulsed for so a
+// repeat is re-acked without opening the door twice.
+const int SEEN_IDS = 16;
+String seenIds[SEEN_IDS];
+int seenNext = 0;
+
+bool alreadyRan(const char *reqId)
+{
+    if (reqId[0] == '\0')
+        return false; // no id: nothing to dedup on
+    for (int i = 0; i < SEEN_IDS; i++)
+        if (seenIds[i] == reqId)
+            return true;
+    return false;
+}
+
+void rememberRan(const char *reqId)
+{
+    if (reqId[0] == '\0')
+        return;
+    seenIds[seenNext] = reqId;
+    seenNext = (seenNext + 1) % SEEN_IDS;
 }
 
 // ======== CMD HANDLER ========
@@ -124,10 +151,17 @@ void handleCmd(char *topic, byte *payload, unsigned int len)
     LOGF("[CMD] action=%s locker_id=%d duration_ms=%d user=%s req=%s conf=%.3f live=%.3f\n",
          action, lockerId, durationMs, userId, reqId, conf, live);
 
-    if (strcmp(action, "unlock") == 0 && lockerId >= 1)
-    {
-        pulseRelay(lockerId, durationMs);
+    if (strcmp(action, "unlock") != 0 || lockerId < 1)
+        return;
+    bool repeat = alreadyRan(reqId);
+    if (repeat)
+        LOGF("[CMD] req=%s already ran, re-acking without a pulse\n", reqId);
 
+    // Only the controller that owns the locker acks; others ignore the cmd
+    if (repeat || pulseRelay(lockerId, durationMs))
+    {
+        if (!repeat)
+            rememberRan(reqId);
         // Emit door event
         StaticJsonDocument<384> ev;
         ev["locker_id"] = lockerId;